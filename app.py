@@ -2,16 +2,30 @@ import streamlit as st
 import os
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.prompts import PromptTemplate
-from langchain.schema import HumanMessage
-from langchain.agents import initialize_agent, AgentType
+from langchain.schema import AIMessage, ChatGeneration, ChatResult, HumanMessage
+from langchain.chat_models.base import BaseChatModel
 from langchain.tools import Tool
-from langchain.memory import ConversationBufferMemory
+from langchain.callbacks.base import BaseCallbackHandler
 import json
 import re
 import datetime
+import time
+import sqlite3
+import math
+import gzip
+import difflib
+import bisect
+import hashlib
+from collections import Counter
+from itertools import accumulate, islice, repeat
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 
 # Custom CSS for baby pink theme and improved UI
-st.markdown("""
+PAGE_CSS = """
 <style>
     /* Main app background - baby pink */
     .stApp {
@@ -139,88 +153,977 @@ st.markdown("""
         border-radius: 8px;
     }
 </style>
-""", unsafe_allow_html=True)
-
-# Set page config
-st.set_page_config(
-    page_title="CodeCritic AI",
-    page_icon="🔍",
-    layout="wide",
-    initial_sidebar_state="expanded"
-)
+"""
+
+def setup_page():
+    """Page config, theme and session state. Runs under main() only, so the analyzers and
+    stores can be imported by the watcher, workers and benchmarks without a Streamlit page"""
+    st.set_page_config(
+        page_title="CodeCritic AI",
+        page_icon="🔍",
+        layout="wide",
+        initial_sidebar_state="expanded"
+    )
+    st.markdown(PAGE_CSS, unsafe_allow_html=True)
+
+    if 'review_history' not in st.session_state:
+        st.session_state.review_history = []
+
+    if 'route_stats' not in st.session_state:
+        st.session_state.route_stats = {}
+
+    if 'finding_store' not in st.session_state:
+        st.session_state.finding_store = None
+
+# Model routes, cheapest first. Costs are USD per 1K tokens and only used for estimates.
+MODEL_ROUTES = {
+    'fast': {
+        'model': 'gemini-1.5-flash-8b',
+        'temperature': 0.3,
+        'cost_per_1k_tokens': 0.0000375
+    },
+    'standard': {
+        'model': 'gemini-1.5-flash',
+        'temperature': 0.3,
+        'cost_per_1k_tokens': 0.000075
+    },
+    'strong': {
+        'model': 'gemini-1.5-pro',
+        'temperature': 0.2,
+        'cost_per_1k_tokens': 0.00125
+    }
+}
+
+# Model name -> USD per 1K tokens, for pricing each call by the model that served it
+MODEL_COSTS = {config['model']: config['cost_per_1k_tokens'] for config in MODEL_ROUTES.values()}
+MODEL_COSTS['offline'] = 0.0
 
-# Initialize session state
-if 'review_history' not in st.session_state:
-    st.session_state.review_history = []
+# Default routing thresholds, overridable from the sidebar. Scores include 3 points per
+# nesting level; the score thresholds keep roughly the same share of stdlib functions on
+# each tier as before nesting was measured (about 88% fast, 9% standard, 3% strong).
+DEFAULT_ROUTING_RULES = {
+    'fast_max_score': 20,
+    'fast_max_lines': 60,
+    'strong_min_score': 37,
+    'escalate_on_missing_score': True
+}
 
 @st.cache_resource
-def initialize_llm(api_key):
+def initialize_llm(api_key, model="gemini-1.5-flash", temperature=0.3):
     """Initialize Gemini LLM with LangChain"""
     try:
         llm = ChatGoogleGenerativeAI(
-            model="gemini-1.5-flash",
+            model=model,
             google_api_key=api_key,
-            temperature=0.3
+            temperature=temperature
         )
         return llm
     except Exception as e:
         st.error(f"Error initializing LLM: {str(e)}")
         return None
 
-def analyze_complexity(code, language):
-    """Analyze code complexity metrics"""
-    lines = [line.strip() for line in code.split('\n') if line.strip()]
-    total_lines = len(lines)
-    
-    # Count various complexity indicators
-    nested_loops = 0
-    conditional_statements = 0
-    function_definitions = 0
-    class_definitions = 0
-    
-    # Language-specific keywords
-    if language.lower() == 'python':
-        loop_keywords = ['for', 'while']
-        condition_keywords = ['if', 'elif', 'else']
-        function_keywords = ['def']
-        class_keywords = ['class']
-    elif language.lower() in ['javascript', 'typescript']:
-        loop_keywords = ['for', 'while', 'do']
-        condition_keywords = ['if', 'else']
-        function_keywords = ['function', 'const', 'let', 'var']
-        class_keywords = ['class']
-    elif language.lower() == 'java':
-        loop_keywords = ['for', 'while', 'do']
-        condition_keywords = ['if', 'else']
-        function_keywords = ['public', 'private', 'protected']
-        class_keywords = ['class', 'interface']
-    else:
-        # Generic approach
-        loop_keywords = ['for', 'while', 'do']
-        condition_keywords = ['if', 'else']
-        function_keywords = ['function', 'def', 'public', 'private']
-        class_keywords = ['class']
+def model_name(llm):
+    """Identity of the model behind an LLM object, e.g. 'gemini-1.5-flash' or 'offline'"""
+    return str(getattr(llm, 'model', None) or 'unknown').removeprefix('models/')
+
+def initialize_route_llm(api_key, route):
+    """Initialize the LLM configured for a routing tier"""
+    config = MODEL_ROUTES[route]
+    return initialize_llm(api_key, config['model'], config['temperature'])
+
+def select_route(complexity_data, rules=None):
+    """Pick the cheapest route that fits the code's complexity"""
+    rules = rules or DEFAULT_ROUTING_RULES
+    score = complexity_data['complexity_score']
     
-    nesting_level = 0
-    max_nesting = 0
+    if score >= rules['strong_min_score']:
+        return 'strong'
+    if score < rules['fast_max_score'] and complexity_data['total_lines'] <= rules['fast_max_lines']:
+        return 'fast'
+    return 'standard'
+
+def next_route(route):
+    """Return the next stronger route, or None if already at the top"""
+    routes = list(MODEL_ROUTES)
+    index = routes.index(route)
+    return routes[index + 1] if index + 1 < len(routes) else None
+
+def is_low_confidence(review_content):
+    """Check whether a review is missing the SCORE line the parser relies on"""
+    return not re.search(r'^\s*SCORE:', review_content or '', re.MULTILINE)
+
+def estimate_tokens(text):
+    """Rough token estimate (about 4 characters per token)"""
+    return max(1, len(text) // 4)
+
+def record_route_stats(route, latency, tokens, escalated=False):
+    """Accumulate per-route latency and cost statistics in session state"""
+    stats = st.session_state.route_stats.setdefault(route, {
+        'calls': 0,
+        'escalations': 0,
+        'total_latency': 0.0,
+        'total_tokens': 0,
+        'total_cost': 0.0
+    })
+    stats['calls'] += 1
+    stats['total_latency'] += latency
+    stats['total_tokens'] += tokens
+    stats['total_cost'] += tokens / 1000 * MODEL_ROUTES[route]['cost_per_1k_tokens']
+    if escalated:
+        stats['escalations'] += 1
+
+class UsageCallbackHandler(BaseCallbackHandler):
+    """Count LLM calls, tokens and cost for one review, including calls made inside agent tools"""
     
-    for line in lines:
-        # Count indentation level (rough estimate of nesting)
-        indent = len(line) - len(line.lstrip())
-        current_nesting = indent // 4  # Assuming 4-space indentation
-        max_nesting = max(max_nesting, current_nesting)
-        
-        # Count keywords
-        words = line.lower().split()
-        for word in words:
-            if word in loop_keywords:
-                nested_loops += 1
-            elif word in condition_keywords:
-                conditional_statements += 1
-            elif word in function_keywords:
-                function_definitions += 1
-            elif word in class_keywords:
-                class_definitions += 1
+    def __init__(self):
+        self.llm_calls = 0
+        self.tokens = 0
+        self.cost = 0.0
+        self.models = set()
+        # run_id -> (model, estimated prompt tokens) for calls in flight
+        self._calls = {}
+    
+    @property
+    def model(self):
+        """The model that served every call, 'mixed' if several did, or None if there were no calls"""
+        if len(self.models) > 1:
+            return "mixed"
+        return next(iter(self.models), None)
+    
+    def on_chat_model_start(self, serialized, messages, *, run_id=None, invocation_params=None, **kwargs):
+        model = (invocation_params or {}).get('model') or 'unknown'
+        prompt_tokens = sum(
+            estimate_tokens(str(message.content)) for batch in messages for message in batch
+        )
+        self._calls[run_id] = (model.removeprefix('models/'), prompt_tokens)
+    
+    def on_llm_end(self, response, *, run_id=None, **kwargs):
+        model, prompt_tokens = self._calls.pop(run_id, ('unknown', 0))
+        tokens = 0
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, 'message', None)
+                usage = getattr(message, 'usage_metadata', None) or {}
+                tokens += usage.get('total_tokens') or prompt_tokens + estimate_tokens(generation.text)
+        
+        self.llm_calls += 1
+        self.tokens += tokens
+        self.models.add(model)
+        cost_per_1k = MODEL_COSTS.get(model, MODEL_ROUTES['standard']['cost_per_1k_tokens'])
+        self.cost += tokens / 1000 * cost_per_1k
+    
+    def on_llm_error(self, error, *, run_id=None, **kwargs):
+        self._calls.pop(run_id, None)
+
+# Fenced code block in a review prompt; greedy so fences inside the code don't end it early.
+# The template indents the fence, and that indentation lands only on the first code line,
+# so it is matched (\1) and dropped there rather than dedenting the whole block.
+OFFLINE_CODE_BLOCK = re.compile(r'^([ \t]*)```(\w*)\n\1([\s\S]*)\n[ \t]*```', re.MULTILINE)
+
+class OfflineLLM(BaseChatModel):
+    """Deterministic chat model stand-in for benchmarks and offline runs; makes no network calls.
+    
+    Answers review prompts in the simple readable format, built from the local complexity
+    analysis of the code in the prompt, after an optional simulated latency.
+    """
+    model: str = "offline"
+    latency: float = 0.0
+    
+    @property
+    def _llm_type(self):
+        return "codecritic-offline"
+    
+    @property
+    def _identifying_params(self):
+        return {'model': self.model}
+    
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        prompt = str(messages[-1].content)
+        match = OFFLINE_CODE_BLOCK.search(prompt)
+        language, code = (match.group(2) or 'generic', match.group(3)) if match else ('generic', prompt)
+        
+        complexity = analyze_complexity(code, language)
+        review = {'score': None, 'summary': None, 'sections': {name: [] for name in REVIEW_SECTIONS}}
+        review['score'] = f"{max(1.0, 10 - complexity['complexity_score'] / 10):.1f}/10"
+        review['summary'] = f"{complexity['complexity_level']} complexity {language} code ({complexity['total_lines']} lines)."
+        review['sections']['STRENGTHS'].append(f"{complexity['function_definitions']} functions keep the logic split up")
+        for function in sorted(analyze_functions(code, language), key=lambda f: -f['complexity_score'])[:3]:
+            section = 'HIGH_PRIORITY_ISSUES' if function['complexity_level'] == 'High' else 'MEDIUM_PRIORITY_ISSUES'
+            review['sections'][section].append(
+                f"{function['name']} has complexity score {function['complexity_score']} "
+                f"(Lines {function['first_line']}-{function['last_line']}) | Fix: Split it into smaller functions"
+            )
+        if complexity['max_nesting'] > 3:
+            review['sections']['LOW_PRIORITY_ISSUES'].append(
+                f"Nesting reaches {complexity['max_nesting']} levels | Fix: Use early returns"
+            )
+        content = format_review_sections(review)
+        
+        if self.latency:
+            time.sleep(self.latency)
+        input_tokens = estimate_tokens(prompt)
+        output_tokens = estimate_tokens(content)
+        message = AIMessage(content=content, usage_metadata={
+            'input_tokens': input_tokens,
+            'output_tokens': output_tokens,
+            'total_tokens': input_tokens + output_tokens
+        })
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+# Persistent per-review metrics for the admin dashboard
+METRICS_DB_PATH = os.environ.get('CODECRITIC_METRICS_DB', 'codecritic_metrics.db')
+
+def connect_metrics_store(path=METRICS_DB_PATH):
+    """Open the metrics database, creating the table on first use"""
+    conn = sqlite3.connect(path)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS review_metrics (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp REAL NOT NULL,
+            mode TEXT NOT NULL,
+            language TEXT NOT NULL,
+            model TEXT,
+            input_chars INTEGER NOT NULL,
+            complexity_score REAL,
+            llm_calls INTEGER NOT NULL,
+            tokens INTEGER NOT NULL,
+            cost REAL NOT NULL,
+            latency REAL NOT NULL,
+            cache_hit INTEGER NOT NULL,
+            success INTEGER NOT NULL
+        )
+    """)
+    return conn
+
+def record_review_metrics(record, path=METRICS_DB_PATH):
+    """Append one review's metrics to the store; never let metrics break a review"""
+    try:
+        conn = connect_metrics_store(path)
+        with conn:
+            conn.execute(
+                """
+                INSERT INTO review_metrics (
+                    timestamp, mode, language, model, input_chars, complexity_score,
+                    llm_calls, tokens, cost, latency, cache_hit, success
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    record.get('timestamp', time.time()), record['mode'], record['language'],
+                    record.get('model'), record['input_chars'], record.get('complexity_score'),
+                    record['llm_calls'], record['tokens'], record['cost'], record['latency'],
+                    int(record.get('cache_hit', False)), int(record.get('success', True))
+                )
+            )
+        conn.close()
+    except sqlite3.Error as e:
+        st.warning(f"Could not record review metrics: {str(e)}")
+
+def load_review_metrics(path=METRICS_DB_PATH, since=None):
+    """Load recorded review metrics as a list of dicts, oldest first"""
+    conn = connect_metrics_store(path)
+    conn.row_factory = sqlite3.Row
+    query = "SELECT * FROM review_metrics"
+    params = ()
+    if since is not None:
+        query += " WHERE timestamp >= ?"
+        params = (since,)
+    rows = [dict(row) for row in conn.execute(query + " ORDER BY timestamp", params)]
+    conn.close()
+    return rows
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = math.ceil(pct / 100 * len(ordered))
+    return ordered[max(0, min(len(ordered), rank) - 1)]
+
+def summarize_metrics(rows):
+    """Aggregate throughput, latency percentiles and cost for a group of reviews"""
+    latencies = [row['latency'] for row in rows]
+    span_hours = (rows[-1]['timestamp'] - rows[0]['timestamp']) / 3600 if len(rows) > 1 else 0
+    total_cost = sum(row['cost'] for row in rows)
+    return {
+        'reviews': len(rows),
+        'reviews_per_hour': round(len(rows) / span_hours, 1) if span_hours else None,
+        'p50_latency': round(percentile(latencies, 50), 2),
+        'p90_latency': round(percentile(latencies, 90), 2),
+        'p99_latency': round(percentile(latencies, 99), 2),
+        'avg_llm_calls': round(sum(row['llm_calls'] for row in rows) / len(rows), 1),
+        'avg_tokens': round(sum(row['tokens'] for row in rows) / len(rows)),
+        'total_cost': round(total_cost, 4),
+        'cost_per_review': round(total_cost / len(rows), 5),
+        'cache_hit_rate': round(sum(row['cache_hit'] for row in rows) / len(rows), 2),
+        'error_rate': round(sum(1 - row['success'] for row in rows) / len(rows), 2)
+    }
+
+def aggregate_review_metrics(rows, group_by=('language', 'mode')):
+    """Group review metrics and summarize each group"""
+    groups = {}
+    for row in rows:
+        key = tuple(row[field] for field in group_by)
+        groups.setdefault(key, []).append(row)
+    
+    summaries = []
+    for key, group_rows in sorted(groups.items()):
+        summary = dict(zip(group_by, key))
+        summary.update(summarize_metrics(group_rows))
+        summaries.append(summary)
+    return summaries
+
+# Working tree index kept current by `python watcher.py watch`
+INDEX_DB_PATH = os.environ.get('CODECRITIC_INDEX_DB', 'codecritic_index.db')
+METRIC_COLUMNS = [
+    'total_lines', 'complexity_score', 'complexity_level', 'nested_loops',
+    'conditional_statements', 'function_definitions', 'class_definitions', 'max_nesting'
+]
+
+def connect_index_store(path=INDEX_DB_PATH):
+    """Open the index database in WAL mode so the dashboard can read while the watcher writes"""
+    conn = sqlite3.connect(path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    metric_columns = ', '.join(f"{column} {'TEXT' if column == 'complexity_level' else 'REAL'}" for column in METRIC_COLUMNS)
+    conn.executescript(f"""
+        CREATE TABLE IF NOT EXISTS indexed_files (
+            path TEXT PRIMARY KEY,
+            language TEXT NOT NULL,
+            content_hash TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            mtime REAL NOT NULL,
+            indexed_at REAL NOT NULL,
+            {metric_columns}
+        );
+        CREATE TABLE IF NOT EXISTS indexed_functions (
+            path TEXT NOT NULL,
+            name TEXT NOT NULL,
+            first_line INTEGER NOT NULL,
+            last_line INTEGER NOT NULL,
+            content_hash TEXT NOT NULL,
+            {metric_columns}
+        );
+        CREATE INDEX IF NOT EXISTS indexed_functions_path ON indexed_functions (path);
+        CREATE INDEX IF NOT EXISTS indexed_functions_score ON indexed_functions (complexity_score DESC);
+        CREATE TABLE IF NOT EXISTS function_reviews (
+            content_hash TEXT PRIMARY KEY,
+            path TEXT NOT NULL,
+            name TEXT NOT NULL,
+            codec TEXT NOT NULL,
+            review BLOB NOT NULL,
+            reviewed_at REAL NOT NULL
+        );
+    """)
+    return conn
+
+def store_file_index(conn, file_record, functions):
+    """Replace a file's index rows; returns the functions whose content hash is new for this file"""
+    previous = {
+        row['content_hash']
+        for row in conn.execute("SELECT content_hash FROM indexed_functions WHERE path = ?", (file_record['path'],))
+    }
+    file_columns = ['path', 'language', 'content_hash', 'size', 'mtime', 'indexed_at'] + METRIC_COLUMNS
+    function_columns = ['path', 'name', 'first_line', 'last_line', 'content_hash'] + METRIC_COLUMNS
+    with conn:
+        conn.execute(
+            f"INSERT OR REPLACE INTO indexed_files ({', '.join(file_columns)}) VALUES ({', '.join('?' * len(file_columns))})",
+            [file_record[column] for column in file_columns]
+        )
+        conn.execute("DELETE FROM indexed_functions WHERE path = ?", (file_record['path'],))
+        conn.executemany(
+            f"INSERT INTO indexed_functions ({', '.join(function_columns)}) VALUES ({', '.join('?' * len(function_columns))})",
+            [[file_record['path'] if column == 'path' else function[column] for column in function_columns] for function in functions]
+        )
+    return [function for function in functions if function['content_hash'] not in previous]
+
+def remove_file_index(conn, path):
+    """Drop a deleted (or no longer indexable) file from the index"""
+    with conn:
+        conn.execute("DELETE FROM indexed_files WHERE path = ?", (path,))
+        conn.execute("DELETE FROM indexed_functions WHERE path = ?", (path,))
+
+def load_hotspots(path=INDEX_DB_PATH, limit=10):
+    """Most complex functions across the indexed tree, highest score first"""
+    conn = connect_index_store(path)
+    rows = conn.execute(
+        """
+        SELECT f.*, r.reviewed_at IS NOT NULL AS reviewed
+        FROM indexed_functions f LEFT JOIN function_reviews r ON r.content_hash = f.content_hash
+        ORDER BY f.complexity_score DESC, f.path, f.first_line LIMIT ?
+        """,
+        (limit,)
+    ).fetchall()
+    conn.close()
+    return [dict(row) for row in rows]
+
+def load_file_index(file_path, path=INDEX_DB_PATH):
+    """Indexed metrics for one file and its functions, or None if the file isn't indexed"""
+    conn = connect_index_store(path)
+    file_row = conn.execute("SELECT * FROM indexed_files WHERE path = ?", (file_path,)).fetchone()
+    if file_row is None:
+        conn.close()
+        return None
+    functions = conn.execute(
+        """
+        SELECT f.*, r.codec, r.review
+        FROM indexed_functions f LEFT JOIN function_reviews r ON r.content_hash = f.content_hash
+        WHERE f.path = ? ORDER BY f.first_line
+        """,
+        (file_path,)
+    ).fetchall()
+    conn.close()
+    return {**dict(file_row), 'functions': [dict(row) for row in functions]}
+
+def store_function_review(conn, function, review_content):
+    """Keep a background review of one function version, compressed"""
+    codec, payload = compress_text(review_content)
+    with conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO function_reviews (content_hash, path, name, codec, review, reviewed_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (function['content_hash'], function['path'], function['name'], codec, payload, time.time())
+        )
+
+def has_function_review(conn, content_hash):
+    """Whether this exact function body was already reviewed"""
+    return conn.execute("SELECT 1 FROM function_reviews WHERE content_hash = ?", (content_hash,)).fetchone() is not None
+
+# Review results shared by the app and `python workers.py` processes, keyed by input hash
+RESULTS_DB_PATH = os.environ.get('CODECRITIC_RESULTS_DB', 'codecritic_results.db')
+# OfflineLLM output is never real review content, so offline runs default to their own store
+OFFLINE_RESULTS_DB_PATH = os.environ.get('CODECRITIC_OFFLINE_RESULTS_DB', 'codecritic_offline_results.db')
+
+def review_cache_key(code, language, mode, model):
+    """Content hash identifying a review of this exact input, in this mode, by this model"""
+    return hashlib.blake2b(f"{mode}\0{model}\0{language}\0{code}".encode('utf-8'), digest_size=16).hexdigest()
+
+def connect_result_store(path=RESULTS_DB_PATH):
+    """Open the result store in WAL mode, safe for concurrent readers and writers across processes"""
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS review_results (
+            cache_key TEXT PRIMARY KEY,
+            language TEXT NOT NULL,
+            mode TEXT NOT NULL,
+            route TEXT,
+            complexity_score REAL,
+            codec TEXT NOT NULL,
+            review BLOB NOT NULL,
+            created_at REAL NOT NULL
+        )
+    """)
+    return conn
+
+def load_cached_review(conn, cache_key):
+    """Return (review, route) for a stored result, or None"""
+    row = conn.execute(
+        "SELECT codec, review, route FROM review_results WHERE cache_key = ?", (cache_key,)
+    ).fetchone()
+    if row is None:
+        return None
+    return decompress_text(row[0], row[1]), row[2]
+
+def store_review_result(conn, cache_key, record):
+    """Save a finished review; the first writer wins if two processes race on the same input"""
+    codec, payload = compress_text(record['review'])
+    with conn:
+        conn.execute(
+            """
+            INSERT OR IGNORE INTO review_results (
+                cache_key, language, mode, route, complexity_score, codec, review, created_at
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                cache_key, record['language'], record['mode'], record.get('route'),
+                record.get('complexity_score'), codec, payload, time.time()
+            )
+        )
+
+# Input size limits (characters). Inputs above CHUNK_CHARS are reviewed chunk by chunk.
+MAX_INPUT_CHARS = 2_000_000
+CHUNK_CHARS = 60_000
+
+class CodeBuffer:
+    """Immutable view of the submitted code shared by prompts and agent tools"""
+    __slots__ = ('code', 'language', '_prompts')
+    
+    def __init__(self, code, language):
+        object.__setattr__(self, 'code', code)
+        object.__setattr__(self, 'language', language)
+        object.__setattr__(self, '_prompts', {})
+    
+    def __setattr__(self, name, value):
+        raise AttributeError("CodeBuffer is immutable")
+    
+    def __len__(self):
+        return len(self.code)
+    
+    def prompt(self, template):
+        """Format a prompt template once and reuse the result for retries and fallbacks"""
+        key = id(template)
+        if key not in self._prompts:
+            self._prompts[key] = template.format(language=self.language, code=self.code)
+        return self._prompts[key]
+
+def iter_lines(code):
+    """Yield lines one at a time without building a list of the whole input"""
+    start = 0
+    length = len(code)
+    while start < length:
+        end = code.find('\n', start)
+        if end == -1:
+            end = length
+        yield code[start:end]
+        start = end + 1
+
+def iter_chunks(code, max_chars=CHUNK_CHARS):
+    """Yield (first_line, last_line, chunk) pieces of at most max_chars, split on line boundaries"""
+    start = 0
+    first_line = 1
+    length = len(code)
+    while start < length:
+        end = min(start + max_chars, length)
+        if end < length:
+            newline = code.rfind('\n', start, end)
+            if newline > start:
+                end = newline + 1
+        chunk = code[start:end]
+        # A line longer than max_chars is split mid-line; only newlines move on to the next line
+        yield first_line, first_line + chunk.count('\n', 0, len(chunk) - 1), chunk
+        first_line += chunk.count('\n')
+        start = end
+
+# Token patterns shared by the language analyzers
+# Loops are unrolled ("normal* (special normal*)*") so long strings and comments
+# are consumed without trying an alternation at every character
+C_BLOCK_COMMENT = r'/\*[^*]*\*+(?:[^/*][^*]*\*+)*/'
+C_COMMENTS = [r'//[^\n]*', C_BLOCK_COMMENT]
+HASH_COMMENT = r'#[^\n]*'
+DOUBLE_QUOTED = r'"[^"\\\n]*(?:\\.[^"\\\n]*)*"'
+SINGLE_QUOTED = r"'[^'\\\n]*(?:\\.[^'\\\n]*)*'"
+CHAR_LITERAL = r"'(?:\\.|[^'\\\n])'"
+BACKTICK_QUOTED = r'`[^`\\]*(?:\\.[^`\\]*)*`'
+
+# An opening parenthesis that starts a function or method body, e.g. `size() {`,
+# `render(props) {` or `run(): void {`; control statements are excluded by lookbehind
+CONTROL_STATEMENTS = [
+    'if', 'for', 'foreach', 'while', 'switch', 'catch',
+    'with', 'using', 'lock', 'fixed', 'synchronized'
+]
+# Lookbehinds must be fixed width, so statements are grouped by length to keep the checks few
+CONTROL_STATEMENTS_BY_LENGTH = {}
+for _word in CONTROL_STATEMENTS:
+    CONTROL_STATEMENTS_BY_LENGTH.setdefault(len(_word), []).append(_word)
+C_STYLE_FUNCTION = (
+    r'\((?=[^;{}()]*\)\s*(?::[^;{}()=:]+|(?:const|noexcept|override|throws\s+[\w.]+(?:\s*,\s*[\w.]+)*)\s*)*\{)'
+    + ''.join(
+        rf'(?<!\b(?:{"|".join(words)})\()(?<!\b(?:{"|".join(words)}) \()'
+        for words in CONTROL_STATEMENTS_BY_LENGTH.values()
+    )
+)
+
+C_FAMILY_LOOPS = ['for', 'while', 'do']
+C_FAMILY_CONDITIONS = ['if', 'else', 'switch', 'case']
+
+# Declarative specs, compiled into analyzers on first use. Keys:
+#   keywords: category -> words, for the loop, condition, function and class categories
+#   functions: extra patterns marking function definitions, producing one of function_tokens
+#   comments / strings / skip: spans consumed without counting keywords inside them
+#   nesting: 'brackets' (depth of the chars in brackets), 'tags' (HTML element depth)
+#            or 'indent' (indentation after each block_start, in indent_width steps)
+#   block_end: keyword closing an indented block on its own line, included in function spans
+LANGUAGE_SPECS = {
+    'python': {
+        'keywords': {
+            'loop': ['for', 'while'],
+            'condition': ['if', 'elif', 'else'],
+            'function': ['def'],
+            'class': ['class']
+        },
+        'comments': [HASH_COMMENT],
+        'strings': [r'"""[\s\S]*?"""', r"'''[\s\S]*?'''", DOUBLE_QUOTED, SINGLE_QUOTED],
+        'nesting': 'indent',
+        'block_start': r':[ \t]*(?:#[^\n]*)?\n(?:[ \t]*\n)*[ \t]*',
+        'indent_width': 4
+    },
+    'javascript': {
+        'keywords': {
+            'loop': C_FAMILY_LOOPS,
+            'condition': C_FAMILY_CONDITIONS,
+            'class': ['class']
+        },
+        'functions': ['=>', C_STYLE_FUNCTION],
+        'function_tokens': ['=>', '('],
+        'comments': C_COMMENTS,
+        'strings': [DOUBLE_QUOTED, SINGLE_QUOTED, BACKTICK_QUOTED],
+        'nesting': 'brackets',
+        'brackets': '{}'
+    },
+    'typescript': {
+        'keywords': {
+            'loop': C_FAMILY_LOOPS,
+            'condition': C_FAMILY_CONDITIONS,
+            'class': ['class', 'interface', 'enum']
+        },
+        'functions': ['=>', C_STYLE_FUNCTION],
+        'function_tokens': ['=>', '('],
+        'comments': C_COMMENTS,
+        'strings': [DOUBLE_QUOTED, SINGLE_QUOTED, BACKTICK_QUOTED],
+        'nesting': 'brackets',
+        'brackets': '{}'
+    },
+    'java': {
+        'keywords': {
+            'loop': C_FAMILY_LOOPS,
+            'condition': C_FAMILY_CONDITIONS,
+            'class': ['class', 'interface', 'enum', 'record']
+        },
+        'functions': [C_STYLE_FUNCTION],
+        'function_tokens': ['('],
+        'comments': C_COMMENTS,
+        'strings': [r'"""[\s\S]*?"""', DOUBLE_QUOTED, CHAR_LITERAL],
+        'nesting': 'brackets',
+        'brackets': '{}'
+    },
+    'cpp': {
+        'keywords': {
+            'loop': C_FAMILY_LOOPS,
+            'condition': C_FAMILY_CONDITIONS,
+            'class': ['class', 'struct']
+        },
+        'functions': [C_STYLE_FUNCTION],
+        'function_tokens': ['('],
+        'comments': C_COMMENTS,
+        'strings': [r'R"\([\s\S]*?\)"', DOUBLE_QUOTED, CHAR_LITERAL],
+        'nesting': 'brackets',
+        'brackets': '{}'
+    },
+    'csharp': {
+        'keywords': {
+            'loop': C_FAMILY_LOOPS + ['foreach'],
+            'condition': C_FAMILY_CONDITIONS,
+            'class': ['class', 'interface', 'struct', 'record', 'enum']
+        },
+        'functions': [C_STYLE_FUNCTION],
+        'function_tokens': ['('],
+        'comments': C_COMMENTS,
+        'strings': [r'@"(?:""|[^"])*"', DOUBLE_QUOTED, CHAR_LITERAL],
+        'nesting': 'brackets',
+        'brackets': '{}'
+    },
+    'go': {
+        'keywords': {
+            'loop': ['for'],
+            'condition': ['if', 'else', 'switch', 'case', 'select'],
+            'function': ['func'],
+            'class': ['struct', 'interface']
+        },
+        'comments': C_COMMENTS,
+        'strings': [DOUBLE_QUOTED, BACKTICK_QUOTED, CHAR_LITERAL],
+        'nesting': 'brackets',
+        'brackets': '{}'
+    },
+    'rust': {
+        'keywords': {
+            'loop': ['for', 'while', 'loop'],
+            'condition': ['if', 'else', 'match'],
+            'function': ['fn'],
+            'class': ['struct', 'enum', 'trait']
+        },
+        'comments': C_COMMENTS,
+        'strings': [r'r#*"[\s\S]*?"#*', DOUBLE_QUOTED, CHAR_LITERAL],
+        'nesting': 'brackets',
+        'brackets': '{}'
+    },
+    'php': {
+        'keywords': {
+            'loop': ['for', 'foreach', 'while', 'do'],
+            'condition': ['if', 'elseif', 'else', 'switch', 'case', 'match'],
+            'function': ['function', 'fn'],
+            'class': ['class', 'interface', 'trait', 'enum']
+        },
+        'comments': C_COMMENTS + [HASH_COMMENT],
+        'strings': [DOUBLE_QUOTED, SINGLE_QUOTED],
+        'nesting': 'brackets',
+        'brackets': '{}'
+    },
+    'ruby': {
+        'keywords': {
+            'loop': ['while', 'until', 'for', 'loop'],
+            'condition': ['if', 'elsif', 'else', 'unless', 'case', 'when'],
+            'function': ['def'],
+            'class': ['class', 'module']
+        },
+        'comments': [r'=(?<![^\n]=)begin\b[\s\S]*?\n=end\b', HASH_COMMENT],
+        'strings': [DOUBLE_QUOTED, SINGLE_QUOTED],
+        'nesting': 'indent',
+        'block_start': r'\n(?:[ \t]*\n)*[ \t]*',
+        'block_end': 'end',
+        'indent_width': 2
+    },
+    'html': {
+        'keywords': {},
+        'comments': [r'<!--[\s\S]*?-->'],
+        'strings': [],
+        'nesting': 'tags'
+    },
+    'css': {
+        'keywords': {
+            'condition': ['@media', '@supports', '@container']
+        },
+        'comments': [C_BLOCK_COMMENT],
+        'strings': [DOUBLE_QUOTED, SINGLE_QUOTED],
+        'nesting': 'brackets',
+        'brackets': '{}'
+    },
+    'sql': {
+        'keywords': {
+            'loop': ['while', 'loop', 'cursor'],
+            'condition': ['if', 'elsif', 'else', 'case', 'when'],
+            'function': ['function', 'procedure', 'trigger'],
+            'class': ['table', 'view']
+        },
+        'skip': [r'(?i:end\s+(?:if|loop|while|case))\b'],
+        'comments': [r'--[^\n]*', C_BLOCK_COMMENT],
+        'strings': [r"'(?:''|[^'])*'", DOUBLE_QUOTED],
+        'nesting': 'brackets',
+        'brackets': '()',
+        'ignore_case': True
+    },
+    'generic': {
+        'keywords': {
+            'loop': C_FAMILY_LOOPS,
+            'condition': ['if', 'else'],
+            'function': ['function', 'def', 'func', 'fn'],
+            'class': ['class']
+        },
+        'comments': C_COMMENTS + [HASH_COMMENT],
+        'strings': [DOUBLE_QUOTED, SINGLE_QUOTED],
+        'nesting': 'brackets',
+        'brackets': '{}'
+    }
+}
+
+HTML_VOID_ELEMENTS = [
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input',
+    'link', 'meta', 'source', 'track', 'wbr'
+]
+HTML_TAG_PATTERNS = [
+    r'<[A-Za-z][^<>]*/>',
+    r'<(?i:' + '|'.join(HTML_VOID_ELEMENTS) + r')(?![\w-])',
+    r'<(?=[A-Za-z])',
+    r'</'
+]
+HTML_TAG_DELTAS = {'<': 1, '</': -1}
+
+TOKEN_BATCH_SIZE = 4096
+LINE_COUNT_CHUNK_CHARS = 65536
+
+# Function names: after a keyword (`def name`, `func (r T) name`), before a C-style `(`,
+# or the variable an arrow function is assigned to
+NAME_AFTER_KEYWORD = re.compile(r'\s*(?:\([^()]*\)\s*)?(?:self\.)?([A-Za-z_$][\w$]*[?!]?)')
+NAME_BEFORE_PAREN = re.compile(r'([A-Za-z_$~][\w$]*)\s*\Z')
+NAME_BEFORE_ARROW = re.compile(r'([A-Za-z_$][\w$]*)\s*[=:]\s*(?:async\s+)?(?:\([^()]*\)|[A-Za-z_$][\w$]*)\s*\Z')
+ARROW_BLOCK_BODY = re.compile(r'\s*\{')
+# Start of each non-blank line after the first, capturing its indentation
+INDENTED_LINE = re.compile(r'\n([ \t]*)(?=\S)')
+NAME_CONTEXT_CHARS = 200
+
+def keyword_pattern(first, rests):
+    """Match whole keywords sharing a first character, leading with that character so the regex
+    engine can skip ahead quickly and checks the word boundary once per candidate position"""
+    alternatives = '|'.join(re.escape(rest) for rest in sorted(rests, key=len, reverse=True))
+    return re.escape(first) + r'(?<![\w$@].)(?:' + alternatives + r')(?![\w$])'
+
+def keyword_variants(word, ignore_case):
+    """Spellings to match for a keyword; case-insensitive languages get lower, UPPER and Title case"""
+    if not ignore_case:
+        return [word]
+    return list(dict.fromkeys([word.lower(), word.upper(), word.capitalize()]))
+
+def count_code_lines(code):
+    """Non-blank lines, split in bounded chunks so a large input is never turned into one big list"""
+    lines = 0
+    for _, _, chunk in iter_chunks(code, LINE_COUNT_CHUNK_CHARS):
+        lines += sum(1 for line in chunk.split('\n') if line and not line.isspace())
+    return lines
+
+class LanguageAnalyzer:
+    """Single-pass regex tokenizer that counts complexity indicators for one language"""
+    
+    def __init__(self, spec):
+        self.ignore_case = spec.get('ignore_case', False)
+        self.indent_width = spec.get('indent_width', 4)
+        self.nesting = spec['nesting']
+        self.brackets = spec.get('brackets')
+        self.block_end = re.compile(re.escape(spec['block_end']) + r'\b') if spec.get('block_end') else None
+        
+        # Token text -> category
+        self.token_kinds = {}
+        for category, words in spec['keywords'].items():
+            for word in words:
+                self.token_kinds[word.lower() if self.ignore_case else word] = category
+        for token in spec.get('function_tokens', []):
+            self.token_kinds[token] = 'function'
+        
+        # Alternatives are tried in order: spans that hide keywords come first
+        parts = spec.get('skip', []) + spec['comments'] + spec['strings']
+        self.block_start = None
+        if spec['nesting'] == 'indent':
+            self.block_start = re.compile(spec['block_start'])
+            parts.append(spec['block_start'])
+        keywords_by_first = {}
+        for words in spec['keywords'].values():
+            for word in words:
+                for variant in keyword_variants(word, self.ignore_case):
+                    keywords_by_first.setdefault(variant[0], []).append(variant[1:])
+        parts.extend(keyword_pattern(first, rests) for first, rests in keywords_by_first.items())
+        parts.extend(spec.get('functions', []))
+        
+        self.deltas = {}
+        if spec['nesting'] == 'tags':
+            parts.extend(HTML_TAG_PATTERNS)
+            self.deltas = HTML_TAG_DELTAS
+        elif spec['nesting'] == 'brackets':
+            brackets = spec['brackets']
+            parts.extend(re.escape(char) for char in brackets)
+            self.deltas = {char: 1 for char in brackets[0::2]}
+            self.deltas.update({char: -1 for char in brackets[1::2]})
+        
+        # Every alternative starts with a literal character, which lets the engine skip
+        # straight to candidate positions instead of trying each alternative everywhere
+        self.pattern = re.compile('|'.join(parts), re.MULTILINE)
+    
+    def analyze(self, code):
+        """Count lines, keywords by category and maximum nesting in a single tokenizer pass"""
+        # Token texts are counted at C level; only distinct tokens are classified in Python
+        tokens = map(re.Match.group, self.pattern.finditer(code))
+        max_nesting = 0
+        if not self.deltas:
+            token_counts = Counter(tokens)
+        else:
+            # Bracket depth needs the token order, so walk the stream in bounded batches
+            token_counts = Counter()
+            depth = 0
+            while True:
+                batch = list(islice(tokens, TOKEN_BATCH_SIZE))
+                if not batch:
+                    break
+                token_counts.update(batch)
+                depths = list(accumulate(map(self.deltas.get, batch, repeat(0)), initial=depth))
+                max_nesting = max(max_nesting, max(depths))
+                depth = max(0, depths[-1])
+        
+        counts = {'loop': 0, 'condition': 0, 'function': 0, 'class': 0}
+        for token, count in token_counts.items():
+            kind = self.token_kinds.get(token.lower() if self.ignore_case else token)
+            if kind:
+                counts[kind] += count
+            elif self.block_start and self.block_start.fullmatch(token):
+                indent = len(token[token.rfind('\n') + 1:].expandtabs(4))
+                max_nesting = max(max_nesting, indent // self.indent_width)
+        
+        return {
+            'total_lines': count_code_lines(code),
+            'nested_loops': counts['loop'],
+            'conditional_statements': counts['condition'],
+            'function_definitions': counts['function'],
+            'class_definitions': counts['class'],
+            'max_nesting': max_nesting
+        }
+    
+    def function_name(self, code, match):
+        """Best-effort name for the function whose definition token is match"""
+        token = match.group()
+        if token == '(':
+            name = NAME_BEFORE_PAREN.search(code, max(0, match.start() - NAME_CONTEXT_CHARS), match.start())
+        elif token == '=>':
+            name = NAME_BEFORE_ARROW.search(code, max(0, match.start() - NAME_CONTEXT_CHARS), match.start())
+        else:
+            name = NAME_AFTER_KEYWORD.match(code, match.end())
+        return name.group(1) if name else '<anonymous>'
+    
+    def function_spans(self, code):
+        """Yield (name, start, end) offsets of each function, from its definition line to its last line"""
+        if self.nesting == 'indent':
+            yield from self._indented_function_spans(code)
+        elif self.nesting == 'brackets' and self.brackets == '{}':
+            yield from self._braced_function_spans(code)
+    
+    def _braced_function_spans(self, code):
+        # A definition token opens a function at the next '{', unless a ';' ends it first
+        # (declarations, expression-bodied arrows); the function closes when depth drops back
+        open_functions = []
+        pending = None
+        depth = 0
+        for match in self.pattern.finditer(code):
+            token = match.group()
+            if token == '{':
+                depth += 1
+                if pending and code.find(';', pending[2], match.start()) == -1:
+                    open_functions.append((pending[0], pending[1], depth))
+                pending = None
+            elif token == '}':
+                if open_functions and open_functions[-1][2] == depth:
+                    name, start, _ = open_functions.pop()
+                    yield name, start, match.end()
+                depth = max(0, depth - 1)
+            elif self.token_kinds.get(token) == 'function':
+                if token == '=>' and not ARROW_BLOCK_BODY.match(code, match.end()):
+                    continue
+                line_start = code.rfind('\n', 0, match.start()) + 1
+                pending = (self.function_name(code, match), line_start, match.end())
+    
+    def _indented_function_spans(self, code):
+        # A function runs until the next code line indented no deeper than its definition;
+        # comment lines and closing brackets of a multi-line signature don't end it
+        for match in self.pattern.finditer(code):
+            if self.token_kinds.get(match.group()) != 'function':
+                continue
+            line_start = code.rfind('\n', 0, match.start()) + 1
+            prefix = code[line_start:match.start()]
+            if prefix.strip() not in ('', 'async'):
+                continue
+            indent = len(prefix.expandtabs(4)) - len(prefix.lstrip())
+            
+            end = len(code)
+            for line in INDENTED_LINE.finditer(code, match.end()):
+                if len(line.group(1).expandtabs(4)) > indent or code[line.end()] in '#)]}':
+                    continue
+                end = line.start()
+                if self.block_end and self.block_end.match(code, line.end()):
+                    line_end = code.find('\n', line.end())
+                    end = len(code) if line_end == -1 else line_end
+                break
+            yield self.function_name(code, match), line_start, end
+
+# Compiled analyzers, built lazily the first time a language is analyzed
+_language_analyzers = {}
+
+def register_language_analyzer(language, spec):
+    """Add or replace the analyzer spec for a language"""
+    LANGUAGE_SPECS[language.lower()] = spec
+    _language_analyzers.pop(language.lower(), None)
+
+def get_language_analyzer(language):
+    """Return the compiled analyzer for a language, falling back to the generic one"""
+    language = language.lower()
+    if language not in LANGUAGE_SPECS:
+        language = 'generic'
+    if language not in _language_analyzers:
+        _language_analyzers[language] = LanguageAnalyzer(LANGUAGE_SPECS[language])
+    return _language_analyzers[language]
+
+def analyze_complexity(code, language):
+    """Analyze code complexity metrics"""
+    metrics = get_language_analyzer(language).analyze(code)
+    nested_loops = metrics['nested_loops']
+    conditional_statements = metrics['conditional_statements']
+    function_definitions = metrics['function_definitions']
+    class_definitions = metrics['class_definitions']
+    max_nesting = metrics['max_nesting']
+    total_lines = metrics['total_lines']
     
     # Calculate complexity score
     complexity_score = (
@@ -254,6 +1157,29 @@ def analyze_complexity(code, language):
         'max_nesting': max_nesting
     }
 
+def analyze_functions(code, language):
+    """Complexity metrics for each function in a file, ordered by position"""
+    analyzer = get_language_analyzer(language)
+    newlines = [match.start() for match in re.finditer('\n', code)]
+    functions = []
+    for name, start, end in analyzer.function_spans(code):
+        source = code[start:end].rstrip()
+        end = start + len(source)
+        body = source
+        if analyzer.nesting == 'indent':
+            # Measure nesting relative to the definition, not the enclosing class
+            indent = len(source) - len(source.lstrip(' \t'))
+            body = re.sub(r'(?m)^[ \t]{0,%d}' % indent, '', source)
+        functions.append({
+            'name': name,
+            'first_line': bisect.bisect_right(newlines, start) + 1,
+            'last_line': bisect.bisect_right(newlines, end - 1) + 1,
+            'code': source,
+            **analyze_complexity(body, language)
+        })
+    functions.sort(key=lambda function: function['first_line'])
+    return functions
+
 def create_complexity_analysis_prompt():
     """Create prompt for AI-based complexity analysis"""
     template = """
@@ -276,6 +1202,7 @@ def create_complexity_analysis_prompt():
     - Long methods/functions
     - Multiple responsibilities
     - Unclear variable names
+    List only the factors present in this code; leave COMPLEXITY_FACTORS: empty if there are none.
     
     SIMPLIFICATION_SUGGESTIONS:
     - Specific recommendations to reduce complexity
@@ -293,148 +1220,160 @@ def create_complexity_analysis_prompt():
         template=template
     )
 
-def create_advanced_agent(llm):
-    """Create an advanced LangChain agent for detailed code analysis"""
+COMPLEXITY_ANALYSIS_PROMPT = create_complexity_analysis_prompt()
+
+TOOL_FINDING_FORMAT = """
+    List each issue on its own line in this EXACT format:
+    - HIGH|MEDIUM|LOW: Issue description (Line number) | Fix: How to resolve it
+    If there are no issues, leave the ISSUES: heading empty instead of writing "None".
+"""
+
+def create_quality_analysis_prompt():
+    """Create prompt for the code quality tool"""
+    template = """
+    Analyze this {language} code for quality, bugs, and improvements:
+
+    {code}
+
+    Provide analysis in this format:
+
+    QUALITY_SCORE: X/10
+    SUMMARY: One sentence summary
+    STRENGTHS:
+    - What's good
+    ISSUES:
+    - Bugs and quality problems with line numbers
+    SUGGESTIONS:
+    - Improvements
+    DOCUMENTATION:
+    - Documentation and comment improvements
+    """ + TOOL_FINDING_FORMAT
     
-    def analyze_code_quality(code_and_lang):
+    return PromptTemplate(
+        input_variables=["language", "code"],
+        template=template
+    )
+
+def create_security_check_prompt():
+    """Create prompt for the security tool"""
+    template = """
+    Check this {language} code for security vulnerabilities:
+
+    {code}
+
+    Focus on:
+    - SQL injection risks
+    - XSS vulnerabilities
+    - Input validation issues
+    - Authentication/authorization problems
+
+    List any security issues found under an ISSUES: heading.
+    """ + TOOL_FINDING_FORMAT
+    
+    return PromptTemplate(
+        input_variables=["language", "code"],
+        template=template
+    )
+
+def create_optimization_prompt():
+    """Create prompt for the performance tool"""
+    template = """
+    Suggest performance optimizations for this {language} code:
+
+    {code}
+
+    Focus on:
+    - Algorithm efficiency
+    - Memory usage
+    - Database query optimization
+    - Loop improvements
+
+    List performance problems under an ISSUES: heading and other
+    optimization ideas under a SUGGESTIONS: heading.
+    """ + TOOL_FINDING_FORMAT
+    
+    return PromptTemplate(
+        input_variables=["language", "code"],
+        template=template
+    )
+
+QUALITY_ANALYSIS_PROMPT = create_quality_analysis_prompt()
+SECURITY_CHECK_PROMPT = create_security_check_prompt()
+OPTIMIZATION_PROMPT = create_optimization_prompt()
+
+def create_review_tools(llm, code_buffer, callbacks=None):
+    """Create the specialised review tools used in agent mode"""
+    # Prompts are formatted once per buffer; tools never copy the code themselves
+    def analyze_code_quality(_tool_input):
         """Comprehensive code quality analysis"""
         try:
-            code, language = code_and_lang.split("|||")
-            prompt = f"""
-            Analyze this {language} code for quality, bugs, and improvements:
-            
-            {code}
-            
-            Provide analysis in this format:
-            
-            QUALITY_SCORE: X/10
-            SUMMARY: One sentence summary
-            STRENGTHS: List what's good
-            CRITICAL_ISSUES: List critical problems with line numbers
-            SUGGESTIONS: List improvements
-            """
-            response = llm.invoke([HumanMessage(content=prompt)])
+            prompt = code_buffer.prompt(QUALITY_ANALYSIS_PROMPT)
+            response = llm.invoke([HumanMessage(content=prompt)], config={'callbacks': callbacks})
             return response.content
         except Exception as e:
             return f"Error in analysis: {str(e)}"
     
-    def check_security_issues(code_and_lang):
+    def check_security_issues(_tool_input):
         """Check for security vulnerabilities"""
         try:
-            code, language = code_and_lang.split("|||")
-            prompt = f"""
-            Check this {language} code for security vulnerabilities:
-            
-            {code}
-            
-            Focus on:
-            - SQL injection risks
-            - XSS vulnerabilities  
-            - Input validation issues
-            - Authentication/authorization problems
-            
-            List any security issues found with specific line references.
-            """
-            response = llm.invoke([HumanMessage(content=prompt)])
+            prompt = code_buffer.prompt(SECURITY_CHECK_PROMPT)
+            response = llm.invoke([HumanMessage(content=prompt)], config={'callbacks': callbacks})
             return response.content
         except Exception as e:
             return f"Error in security check: {str(e)}"
     
-    def suggest_optimizations(code_and_lang):
+    def suggest_optimizations(_tool_input):
         """Suggest performance optimizations"""
         try:
-            code, language = code_and_lang.split("|||")
-            prompt = f"""
-            Suggest performance optimizations for this {language} code:
-            
-            {code}
-            
-            Focus on:
-            - Algorithm efficiency
-            - Memory usage
-            - Database query optimization
-            - Loop improvements
-            
-            Provide specific suggestions with examples.
-            """
-            response = llm.invoke([HumanMessage(content=prompt)])
+            prompt = code_buffer.prompt(OPTIMIZATION_PROMPT)
+            response = llm.invoke([HumanMessage(content=prompt)], config={'callbacks': callbacks})
             return response.content
         except Exception as e:
             return f"Error in optimization analysis: {str(e)}"
     
-    def analyze_complexity_ai(code_and_lang):
+    def analyze_complexity_ai(_tool_input):
         """AI-powered complexity analysis"""
         try:
-            code, language = code_and_lang.split("|||")
-            prompt_template = create_complexity_analysis_prompt()
-            prompt = prompt_template.format(language=language, code=code)
-            response = llm.invoke([HumanMessage(content=prompt)])
+            prompt = code_buffer.prompt(COMPLEXITY_ANALYSIS_PROMPT)
+            response = llm.invoke([HumanMessage(content=prompt)], config={'callbacks': callbacks})
             return response.content
         except Exception as e:
             return f"Error in complexity analysis: {str(e)}"
     
-    tools = [
+    return [
         Tool(
             name="CodeQualityAnalyzer",
             func=analyze_code_quality,
-            description="Analyzes overall code quality, bugs, and structure. Input format: 'code|||language'"
+            description="Analyzes overall code quality, bugs, and structure. Input: the language name (the code is provided automatically)"
         ),
         Tool(
             name="SecurityChecker", 
             func=check_security_issues,
-            description="Checks for security vulnerabilities and risks. Input format: 'code|||language'"
+            description="Checks for security vulnerabilities and risks. Input: the language name (the code is provided automatically)"
         ),
         Tool(
             name="PerformanceOptimizer",
             func=suggest_optimizations,
-            description="Suggests performance improvements and optimizations. Input format: 'code|||language'"
+            description="Suggests performance improvements and optimizations. Input: the language name (the code is provided automatically)"
         ),
         Tool(
             name="ComplexityAnalyzer",
             func=analyze_complexity_ai,
-            description="Analyzes code complexity and suggests simplifications. Input format: 'code|||language'"
+            description="Analyzes code complexity and suggests simplifications. Input: the language name (the code is provided automatically)"
         )
     ]
-    
-    memory = ConversationBufferMemory(memory_key="chat_history")
-    
-    agent = initialize_agent(
-        tools=tools,
-        llm=llm,
-        agent=AgentType.CONVERSATIONAL_REACT_DESCRIPTION,
-        memory=memory,
-        verbose=False
-    )
-    
-    return agent
 
-def review_with_advanced_agent(agent, code, language):
-    """Use advanced agent for comprehensive review"""
-    try:
-        query = f"""
-        Please perform a comprehensive code review of this {language} code using all your available tools.
-        
-        1. First, analyze the overall code quality
-        2. Then, check for security issues
-        3. Next, suggest performance optimizations
-        4. Finally, analyze code complexity and suggest simplifications
-        
-        Combine all findings into a final structured report with:
-        - Overall score
-        - Summary of findings
-        - List of all issues by priority
-        - Complexity analysis
-        - Actionable recommendations
-        
-        Code:
-        {code}
-        """
-        
-        response = agent.run(query)
-        return response, None
-        
-    except Exception as e:
-        return None, str(e)
+def review_with_advanced_agent(tools, code_buffer):
+    """Run every review tool once and merge their findings locally into one report"""
+    outputs = {}
+    for tool in tools:
+        output = tool.run(code_buffer.language)
+        if not output.startswith("Error in "):
+            outputs[tool.name] = output
+    
+    if not outputs:
+        return None, "All review tools failed"
+    return merge_tool_outputs(outputs), None
 
 def create_simple_readable_prompt():
     """Create a simple prompt that generates very readable output"""
@@ -482,6 +1421,8 @@ def create_simple_readable_prompt():
         template=template
     )
 
+SIMPLE_REVIEW_PROMPT = create_simple_readable_prompt()
+
 def display_complexity_metrics(complexity_data):
     """Display complexity metrics in an attractive format"""
     st.markdown("### 📊 Complexity Analysis")
@@ -615,20 +1556,491 @@ def parse_and_display_results(review_content, complexity_data=None):
         st.markdown("### 📄 Raw Review Results")
         st.markdown(review_content)
 
-def review_code(llm, code, language):
+def review_code(llm, code_buffer, callbacks=None):
     """Review code using simple LLM approach with readable format"""
     try:
-        prompt_template = create_simple_readable_prompt()
-        prompt = prompt_template.format(language=language, code=code)
+        prompt = code_buffer.prompt(SIMPLE_REVIEW_PROMPT)
         
-        response = llm.invoke([HumanMessage(content=prompt)])
+        response = llm.invoke([HumanMessage(content=prompt)], config={'callbacks': callbacks})
         return response.content, None
             
     except Exception as e:
         return None, str(e)
 
+def review_code_routed(api_key, code_buffer, complexity_data, rules=None, callbacks=None):
+    """Review code on the cheapest suitable route, escalating on low-confidence results"""
+    rules = rules or DEFAULT_ROUTING_RULES
+    route = select_route(complexity_data, rules)
+    escalated = False
+    prompt = code_buffer.prompt(SIMPLE_REVIEW_PROMPT)
+    
+    while route:
+        llm = initialize_route_llm(api_key, route)
+        if not llm:
+            return None, f"Failed to initialize model for route '{route}'", route
+        
+        start = time.perf_counter()
+        try:
+            response = llm.invoke([HumanMessage(content=prompt)], config={'callbacks': callbacks})
+        except Exception as e:
+            return None, str(e), route
+        latency = time.perf_counter() - start
+        
+        usage = getattr(response, 'usage_metadata', None) or {}
+        tokens = usage.get('total_tokens') or estimate_tokens(prompt) + estimate_tokens(response.content)
+        record_route_stats(route, latency, tokens, escalated)
+        
+        if not (rules['escalate_on_missing_score'] and is_low_confidence(response.content)):
+            return response.content, None, route
+        
+        stronger = next_route(route)
+        if not stronger:
+            return response.content, None, route
+        route = stronger
+        escalated = True
+    
+    return None, "No route available", None
+
+REVIEW_SECTIONS = [
+    'STRENGTHS', 'HIGH_PRIORITY_ISSUES', 'MEDIUM_PRIORITY_ISSUES',
+    'LOW_PRIORITY_ISSUES', 'IMPROVEMENTS', 'DOCUMENTATION'
+]
+
+def parse_review_sections(review_content):
+    """Parse a review in the simple readable format into score, summary and bullet lists"""
+    review = {'score': None, 'summary': None, 'sections': {name: [] for name in REVIEW_SECTIONS}}
+    current_section = None
+    
+    for line in iter_lines(review_content):
+        line = line.strip()
+        if line.startswith('SCORE:'):
+            review['score'] = line.replace('SCORE:', '').strip()
+        elif line.startswith('SUMMARY:'):
+            review['summary'] = line.replace('SUMMARY:', '').strip()
+        elif line.endswith(':') and line[:-1] in review['sections']:
+            current_section = line[:-1]
+        elif line.startswith('- ') and current_section:
+            review['sections'][current_section].append(line[2:].strip())
+    
+    return review
+
+def parse_score(score_text):
+    """Extract the numeric part of an 'X/10' score, or None"""
+    match = re.match(r'\s*(\d+(?:\.\d+)?)', score_text or '')
+    return float(match.group(1)) if match else None
+
+def format_review_sections(review):
+    """Render parsed review sections back into the format parse_and_display_results understands"""
+    lines = []
+    if review['score']:
+        lines.append(f"SCORE: {review['score']}")
+    if review['summary']:
+        lines.append(f"SUMMARY: {review['summary']}")
+    for name in REVIEW_SECTIONS:
+        lines.append(f"{name}:")
+        lines.extend(f"- {item}" for item in review['sections'][name])
+    return '\n'.join(lines)
+
+# Tool output heading -> (report section, default priority for bullets without a severity).
+# Bullets under ISSUES or no heading get their default priority from the tool instead.
+TOOL_SECTIONS = {
+    'STRENGTHS': ('STRENGTHS', None),
+    'CRITICAL_ISSUES': (None, 'HIGH_PRIORITY_ISSUES'),
+    'COMPLEXITY_FACTORS': (None, 'LOW_PRIORITY_ISSUES'),
+    'SUGGESTIONS': ('IMPROVEMENTS', None),
+    'SIMPLIFICATION_SUGGESTIONS': ('IMPROVEMENTS', None),
+    'DOCUMENTATION': ('DOCUMENTATION', None)
+}
+TOOL_DEFAULT_PRIORITY = {
+    'SecurityChecker': 'HIGH_PRIORITY_ISSUES',
+    'PerformanceOptimizer': 'MEDIUM_PRIORITY_ISSUES'
+}
+SEVERITY_SECTIONS = {
+    'CRITICAL': 'HIGH_PRIORITY_ISSUES',
+    'HIGH': 'HIGH_PRIORITY_ISSUES',
+    'MEDIUM': 'MEDIUM_PRIORITY_ISSUES',
+    'LOW': 'LOW_PRIORITY_ISSUES'
+}
+ISSUE_SECTIONS = ['HIGH_PRIORITY_ISSUES', 'MEDIUM_PRIORITY_ISSUES', 'LOW_PRIORITY_ISSUES']
+ISSUE_PENALTIES = {'HIGH_PRIORITY_ISSUES': 1.5, 'MEDIUM_PRIORITY_ISSUES': 0.75, 'LOW_PRIORITY_ISSUES': 0.25}
+# Minimum text similarity for two findings to be merged, with and without overlapping line ranges
+DEDUP_SIMILARITY = 0.75
+DEDUP_SIMILARITY_SAME_LINES = 0.5
+
+TOOL_HEADING = re.compile(r'([A-Z][A-Z_ ]*[A-Z]):\s*(.*)')
+TOOL_BULLET = re.compile(r'(?:[-*\u2022]|\d+[.)])\s+(.+)')
+# Only the forms the tool prompts ask for ("HIGH: ..." or "[HIGH] ..."), so ordinary words
+# like "Critical section ..." or "Low coverage ..." are left alone
+SEVERITY_PREFIX = re.compile(r'(?:\[(CRITICAL|HIGH|MEDIUM|LOW)\]:?|(CRITICAL|HIGH|MEDIUM|LOW):)\s*')
+# Placeholder bullets tools write when there is nothing to report, e.g. "None", "N/A",
+# "No security vulnerabilities found." or an echoed template line like "Deep nesting levels: none"
+EMPTY_FINDING = re.compile(
+    r'(?:[\w /-]+:\s*)?(?:none|n/?a|nil|nothing|not applicable)(?:\s+(?:found|detected|identified))?'
+    r'|(?:there (?:are|were) )?no\b.*\b(?:found|detected|identified|present)\b.*',
+    re.IGNORECASE
+)
+LINE_REFERENCE = re.compile(r'\blines?\s*(\d+)(?:\s*(?:-|\u2013|to)\s*(\d+))?', re.IGNORECASE)
+
+def parse_tool_output(output):
+    """Split free-form tool output into 'KEY: value' fields and bulleted lists under headings"""
+    fields = {}
+    lists = {}
+    current = None
+    in_code_block = False
+    
+    for line in iter_lines(output):
+        line = line.strip()
+        if line.startswith('```'):
+            in_code_block = not in_code_block
+            continue
+        if in_code_block or not line:
+            continue
+        line = line.replace('**', '').lstrip('#').strip()
+        
+        bullet = TOOL_BULLET.match(line)
+        if bullet:
+            lists.setdefault(current, []).append(bullet.group(1).strip())
+            continue
+        heading = TOOL_HEADING.match(line)
+        if heading:
+            key = heading.group(1).replace(' ', '_')
+            if heading.group(2):
+                fields[key] = heading.group(2).strip()
+                current = None
+            else:
+                current = key
+    
+    return fields, lists
+
+def parse_finding(item, source, section):
+    """Turn one tool bullet into a finding dict, reading any severity prefix, fix and line range"""
+    severity = SEVERITY_PREFIX.match(item) if section in ISSUE_SECTIONS else None
+    if severity:
+        section = SEVERITY_SECTIONS[severity.group(1) or severity.group(2)]
+        item = item[severity.end():]
+    
+    text, _, fix = item.partition('|')
+    match = LINE_REFERENCE.search(text)
+    lines = None
+    if match:
+        first = int(match.group(1))
+        lines = (first, int(match.group(2) or first))
+    
+    return {
+        'section': section,
+        'text': text.strip(),
+        'fix': fix.strip(),
+        'lines': lines,
+        'key': ' '.join(re.findall(r'[a-z0-9]+', LINE_REFERENCE.sub('', text.lower()))),
+        'sources': {source}
+    }
+
+def is_empty_finding(finding):
+    """Whether a finding only says there is nothing to report; anything citing a line is kept"""
+    return not finding['text'] or (
+        not finding['lines'] and EMPTY_FINDING.fullmatch(finding['text'].rstrip('.!').strip()) is not None
+    )
+
+def is_duplicate_finding(finding, other):
+    """Findings match when their wording is similar and their line ranges, if both known, overlap"""
+    threshold = DEDUP_SIMILARITY
+    if finding['lines'] and other['lines']:
+        if finding['lines'][0] > other['lines'][1] or other['lines'][0] > finding['lines'][1]:
+            return False
+        threshold = DEDUP_SIMILARITY_SAME_LINES
+    
+    matcher = difflib.SequenceMatcher(None, finding['key'], other['key'], autojunk=False)
+    return matcher.quick_ratio() >= threshold and matcher.ratio() >= threshold
+
+def merge_findings(findings):
+    """Deduplicate findings, keeping the highest priority and widest line range of each group"""
+    merged = []
+    for finding in findings:
+        for existing in merged:
+            if not is_duplicate_finding(finding, existing):
+                continue
+            if finding['section'] in ISSUE_SECTIONS and (
+                ISSUE_SECTIONS.index(finding['section']) < ISSUE_SECTIONS.index(existing['section'])
+            ):
+                existing['section'] = finding['section']
+                existing['text'] = finding['text']
+            existing['fix'] = existing['fix'] or finding['fix']
+            if finding['lines']:
+                existing['lines'] = (
+                    min(existing['lines'][0], finding['lines'][0]), max(existing['lines'][1], finding['lines'][1])
+                ) if existing['lines'] else finding['lines']
+            existing['sources'] |= finding['sources']
+            break
+        else:
+            merged.append(finding)
+    return merged
+
+def merge_tool_outputs(outputs):
+    """Combine agent tool outputs into a report in the simple readable format, without another LLM call"""
+    issues = []
+    others = {name: [] for name in REVIEW_SECTIONS if name not in ISSUE_SECTIONS}
+    scores = []
+    notes = []
+    summary = None
+    
+    for source, output in outputs.items():
+        fields, lists = parse_tool_output(output)
+        for key in ('QUALITY_SCORE', 'SCORE', 'MAINTAINABILITY'):
+            score = parse_score(fields.get(key))
+            if score is not None and 0 <= score <= 10:
+                scores.append(score)
+        summary = summary or fields.get('SUMMARY')
+        if summary and not summary.endswith(('.', '!', '?')):
+            summary += '.'
+        for key, label in (('TIME_COMPLEXITY', 'time'), ('SPACE_COMPLEXITY', 'space')):
+            if fields.get(key):
+                notes.append(f"Estimated {label} complexity: {fields[key]}.")
+        
+        for heading, items in lists.items():
+            section, priority = TOOL_SECTIONS.get(heading, (None, None))
+            if heading in (None, 'ISSUES'):
+                priority = TOOL_DEFAULT_PRIORITY.get(source, 'MEDIUM_PRIORITY_ISSUES')
+            elif not section and not priority:
+                continue
+            for item in items:
+                finding = parse_finding(item, source, section or priority)
+                if not is_empty_finding(finding):
+                    (issues if priority else others[section]).append(finding)
+    
+    review = {'score': None, 'summary': None, 'sections': {name: [] for name in REVIEW_SECTIONS}}
+    for finding in merge_findings(issues):
+        item = f"{finding['text']} | {finding['fix']}" if finding['fix'] else finding['text']
+        review['sections'][finding['section']].append(item)
+    for name, findings in others.items():
+        review['sections'][name] = [finding['text'] for finding in merge_findings(findings)]
+    
+    issue_score = 10 - sum(
+        ISSUE_PENALTIES[name] * len(review['sections'][name]) for name in ISSUE_SECTIONS
+    )
+    scores.append(max(1.0, issue_score))
+    review['score'] = f"{sum(scores) / len(scores):.1f}/10"
+    
+    counts = [len(review['sections'][name]) for name in ISSUE_SECTIONS]
+    review['summary'] = ' '.join(filter(None, [
+        summary,
+        f"{sum(counts)} issues from {len(outputs)} tools ({counts[0]} high, {counts[1]} medium, {counts[2]} low).",
+        *notes
+    ]))
+    return format_review_sections(review)
+
+def review_in_chunks(review_fn, code_buffer, max_chars=CHUNK_CHARS):
+    """Review an oversized input chunk by chunk and combine the results into one report"""
+    combined = {'score': None, 'summary': None, 'sections': {name: [] for name in REVIEW_SECTIONS}}
+    scores = []
+    summaries = []
+    
+    for first_line, last_line, chunk in iter_chunks(code_buffer.code, max_chars):
+        result, error = review_fn(CodeBuffer(chunk, code_buffer.language))
+        if error:
+            return None, f"Lines {first_line}-{last_line}: {error}"
+        
+        review = parse_review_sections(result)
+        score = parse_score(review['score'])
+        if score is not None:
+            scores.append(score)
+        if review['summary']:
+            summaries.append(f"Lines {first_line}-{last_line}: {review['summary']}")
+        for name, items in review['sections'].items():
+            combined['sections'][name].extend(f"[Lines {first_line}-{last_line}] {item}" for item in items)
+    
+    if scores:
+        combined['score'] = f"{sum(scores) / len(scores):.1f}/10"
+    if summaries:
+        combined['summary'] = ' '.join(summaries)
+    return format_review_sections(combined), None
+
+LOCATION_PREFIX = re.compile(r'\[Lines \d+-\d+\] ')
+RAW_COMPRESSION_LEVEL = 9
+
+class FindingStore:
+    """Shared table of interned review strings; compact reviews refer to entries by index"""
+    __slots__ = ('texts', '_ids')
+    
+    def __init__(self):
+        self.texts = ['']
+        self._ids = {'': 0}
+    
+    def __len__(self):
+        return len(self.texts)
+    
+    def intern(self, text):
+        """Return the id for text, adding it to the table the first time it is seen"""
+        text_id = self._ids.get(text)
+        if text_id is None:
+            text_id = self._ids[text] = len(self.texts)
+            self.texts.append(text)
+        return text_id
+    
+    def intern_finding(self, item):
+        """Split a chunk location prefix off a bullet so the finding itself is shared across chunks"""
+        match = LOCATION_PREFIX.match(item)
+        if not match:
+            return 0, self.intern(item)
+        return self.intern(match.group()), self.intern(item[match.end():])
+    
+    def size_bytes(self):
+        """Approximate UTF-8 size of the table, for footprint reporting"""
+        return sum(len(text.encode('utf-8')) for text in self.texts)
+
+def get_finding_store():
+    """Finding table shared by every review in this session's history"""
+    if st.session_state.finding_store is None:
+        st.session_state.finding_store = FindingStore()
+    return st.session_state.finding_store
+
+def compress_text(text, codec=None):
+    """Compress text with zstd when installed, otherwise gzip; returns (codec, payload)"""
+    codec = codec or ('zstd' if zstandard else 'gzip')
+    data = text.encode('utf-8')
+    if codec == 'zstd':
+        return codec, zstandard.ZstdCompressor(level=RAW_COMPRESSION_LEVEL).compress(data)
+    return 'gzip', gzip.compress(data, compresslevel=RAW_COMPRESSION_LEVEL, mtime=0)
+
+def decompress_text(codec, payload):
+    """Inverse of compress_text"""
+    if codec == 'zstd':
+        if not zstandard:
+            raise RuntimeError("zstandard is required to read this review")
+        return zstandard.ZstdDecompressor().decompress(payload).decode('utf-8')
+    return gzip.decompress(payload).decode('utf-8')
+
+def compact_review(review_content, store):
+    """Store a review as interned finding ids, or as compressed raw text unless that would be lossy"""
+    review = parse_review_sections(review_content)
+    # Only reviews already in canonical form survive the structured round trip; anything
+    # with prose, extra headings or missing sections keeps its original text
+    if format_review_sections(review) != review_content.strip():
+        return {'raw': compress_text(review_content)}
+    
+    return {
+        'score': store.intern(review['score'] or ''),
+        'summary': store.intern(review['summary'] or ''),
+        'sections': tuple(
+            tuple(store.intern_finding(item) for item in review['sections'][name])
+            for name in REVIEW_SECTIONS
+        )
+    }
+
+def expand_review(compact, store):
+    """Rebuild review text from compact_review output"""
+    if 'raw' in compact:
+        return decompress_text(*compact['raw'])
+    
+    texts = store.texts
+    return format_review_sections({
+        'score': texts[compact['score']] or None,
+        'summary': texts[compact['summary']] or None,
+        'sections': {
+            name: [texts[location] + texts[finding] for location, finding in findings]
+            for name, findings in zip(REVIEW_SECTIONS, compact['sections'])
+        }
+    })
+
+def display_routing_settings():
+    """Sidebar controls for model routing thresholds"""
+    rules = dict(DEFAULT_ROUTING_RULES)
+    with st.expander("🧭 Routing Rules"):
+        rules['fast_max_score'] = st.number_input(
+            "Fast model: max complexity score", min_value=0.0,
+            value=float(rules['fast_max_score']), step=1.0
+        )
+        rules['fast_max_lines'] = st.number_input(
+            "Fast model: max lines", min_value=0,
+            value=rules['fast_max_lines'], step=10
+        )
+        rules['strong_min_score'] = st.number_input(
+            "Strong model: min complexity score", min_value=0.0,
+            value=float(rules['strong_min_score']), step=1.0
+        )
+        rules['escalate_on_missing_score'] = st.checkbox(
+            "Escalate when no SCORE is returned",
+            value=rules['escalate_on_missing_score']
+        )
+    return rules
+
+def display_route_stats():
+    """Show per-route latency and cost statistics"""
+    if not st.session_state.route_stats:
+        return
+    with st.expander("📈 Routing Stats"):
+        for route, stats in st.session_state.route_stats.items():
+            avg_latency = stats['total_latency'] / stats['calls']
+            st.markdown(
+                f"**{route}** ({MODEL_ROUTES[route]['model']}): {stats['calls']} calls, "
+                f"{stats['escalations']} escalations, avg {avg_latency:.2f}s, "
+                f"~{stats['total_tokens']} tokens, ~${stats['total_cost']:.4f}"
+            )
+
+def display_metrics_dashboard():
+    """Admin page: throughput, latency percentiles and cost from the metrics store"""
+    st.markdown("## 🛠️ Operations Dashboard")
+    
+    window = st.selectbox("Time window", ["Last 24 hours", "Last 7 days", "All time"], index=1)
+    window_seconds = {"Last 24 hours": 86400, "Last 7 days": 7 * 86400}.get(window)
+    since = time.time() - window_seconds if window_seconds else None
+    
+    try:
+        rows = load_review_metrics(since=since)
+    except sqlite3.Error as e:
+        st.error(f"❌ Could not read metrics store: {str(e)}")
+        return
+    
+    if not rows:
+        st.info("📝 No review metrics recorded yet.")
+        return
+    
+    overall = summarize_metrics(rows)
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("📊 Reviews", overall['reviews'])
+    with col2:
+        st.metric("🚀 Reviews / hour", overall['reviews_per_hour'] or "N/A")
+    with col3:
+        st.metric("⏱️ p50 / p90 latency", f"{overall['p50_latency']}s / {overall['p90_latency']}s")
+    with col4:
+        st.metric("💰 Total cost", f"${overall['total_cost']:.4f}")
+    
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("🔁 Avg LLM calls", overall['avg_llm_calls'])
+    with col2:
+        st.metric("🔤 Avg tokens", overall['avg_tokens'])
+    with col3:
+        st.metric("⚡ Cache hit rate", f"{overall['cache_hit_rate']:.0%}")
+    with col4:
+        st.metric("❌ Error rate", f"{overall['error_rate']:.0%}")
+    
+    st.markdown("### 🔧 By Mode")
+    st.dataframe(aggregate_review_metrics(rows, group_by=('mode',)), use_container_width=True)
+    
+    st.markdown("### 🌐 By Language and Mode")
+    st.dataframe(aggregate_review_metrics(rows), use_container_width=True)
+
+def display_index_hotspots():
+    """Admin page: most complex functions from the working tree index, if a watcher has built one"""
+    st.markdown("### 🔥 Working Tree Hotspots")
+    if not os.path.exists(INDEX_DB_PATH):
+        st.info("📝 No working tree index yet. Run `python watcher.py watch <path>` to build one.")
+        return
+    
+    try:
+        hotspots = load_hotspots(limit=20)
+    except sqlite3.Error as e:
+        st.error(f"❌ Could not read working tree index: {str(e)}")
+        return
+    
+    columns = ['path', 'name', 'first_line', 'last_line', 'complexity_score', 'complexity_level', 'max_nesting', 'reviewed']
+    st.dataframe([{column: row[column] for column in columns} for row in hotspots], use_container_width=True)
+
 # Main app
 def main():
+    setup_page()
+
     # Header
     st.markdown("""
     <div class="main-header">
@@ -639,6 +2051,8 @@ def main():
     
     # Sidebar for API key
     with st.sidebar:
+        page = st.radio("Page", ["🔍 Review", "🛠️ Admin Dashboard"], horizontal=True)
+        
         st.markdown("## ⚙️ Configuration")
         api_key = st.text_input(
             "Google API Key",
@@ -663,7 +2077,7 @@ def main():
         use_agent = st.checkbox(
             "🤖 Use AI Agent (Advanced)", 
             value=False,
-            help="Uses LangChain agent with multiple specialized tools for deeper analysis"
+            help="Runs multiple specialized LangChain tools and merges their findings for deeper analysis"
         )
         
         include_complexity = st.checkbox(
@@ -672,6 +2086,22 @@ def main():
             help="Analyze code complexity metrics and provide simplification suggestions"
         )
         
+        use_routing = st.checkbox(
+            "🧭 Smart Model Routing",
+            value=True,
+            help="Send simple code to a faster model and escalate to a stronger one only when needed"
+        )
+        use_cache = st.checkbox(
+            "♻️ Reuse Stored Reviews",
+            value=True,
+            help="Return the stored review when the same code was already reviewed in this mode"
+        )
+        
+        routing_rules = DEFAULT_ROUTING_RULES
+        if use_routing:
+            routing_rules = display_routing_settings()
+            display_route_stats()
+        
         if use_agent:
             st.info("🤖 **Agent mode**: Comprehensive multi-tool analysis")
         else:
@@ -707,6 +2137,11 @@ def main():
         """)
     
     # Main content
+    if page == "🛠️ Admin Dashboard":
+        display_metrics_dashboard()
+        display_index_hotspots()
+        return
+    
     if not api_key:
         st.markdown("""
         <div class="section-header">
@@ -746,6 +2181,7 @@ def main():
             "Paste your code here:",
             height=400,
             placeholder="Enter your code here for comprehensive analysis...",
+            max_chars=MAX_INPUT_CHARS,
             help="Paste your code and get instant quality, security, and complexity analysis"
         )
         
@@ -763,25 +2199,116 @@ def main():
             if not code_input.strip():
                 st.warning("⚠️ Please enter some code to review!")
                 return
+            if len(code_input) > MAX_INPUT_CHARS:
+                st.error(f"❌ Input is too large ({len(code_input):,} characters, limit {MAX_INPUT_CHARS:,})")
+                return
             
-            # Analyze complexity first
+            # Shared by prompts and agent tools so the input is never re-concatenated
+            code_buffer = CodeBuffer(code_input, selected_language)
+            is_large_input = len(code_buffer) > CHUNK_CHARS
+            if is_large_input:
+                st.info(f"📦 Large input: reviewing in chunks of up to {CHUNK_CHARS:,} characters")
+                if use_agent:
+                    st.warning("⚠️ Agent mode is not available for large inputs. Using simple mode.")
+                    use_agent = False
+            
+            # Analyze complexity first (routing needs it even when not displayed)
             complexity_data = None
-            if include_complexity:
+            if include_complexity or use_routing:
                 complexity_data = analyze_complexity(code_input, selected_language)
             
+            route = None
+            usage = UsageCallbackHandler()
+            review_start = time.perf_counter()
+            review_mode = "agent" if use_agent else "routed" if use_routing else "simple"
+            
+            # Reviews are shared with worker processes through the on-disk result store.
+            # Routed reviews are keyed by the tier they start on; chunks may each pick their own.
+            cache_model = model_name(llm)
+            if use_routing:
+                cache_model = "routed" if is_large_input else MODEL_ROUTES[select_route(complexity_data, routing_rules)]['model']
+            cache_key = review_cache_key(code_input, selected_language, review_mode, cache_model)
+            cached_review = None
+            result_store = None
+            try:
+                result_store = connect_result_store()
+                if use_cache:
+                    cached_review = load_cached_review(result_store, cache_key)
+            except sqlite3.Error as e:
+                st.warning(f"Could not open result store: {str(e)}")
+            
             mode_text = "Using AI Agent" if use_agent else "Quick Analysis"
             with st.spinner(f"🤖 Analyzing your code... ({mode_text})"):
-                if use_agent:
-                    # Use advanced LangChain agent
+                if cached_review:
+                    review_result, route = cached_review
+                    error = None
+                elif use_agent:
+                    # Run the specialised tools and merge their findings locally
+                    agent_llm = llm
+                    if use_routing:
+                        route = select_route(complexity_data, routing_rules)
+                        route_llm = initialize_route_llm(api_key, route)
+                        if route_llm:
+                            agent_llm = route_llm
+                        else:
+                            # The default model serves the review, so report and store it as such
+                            route = None
+                            cache_key = review_cache_key(code_input, selected_language, review_mode, model_name(llm))
                     try:
-                        agent = create_advanced_agent(llm)
-                        review_result, error = review_with_advanced_agent(agent, code_input, selected_language)
+                        tools = create_review_tools(agent_llm, code_buffer, [usage])
+                        review_result, error = review_with_advanced_agent(tools, code_buffer)
                     except Exception as e:
                         st.error(f"⚠️ Agent failed: {str(e)}. Using simple mode.")
-                        review_result, error = review_code(llm, code_input, selected_language)
+                        review_result, error = review_code(agent_llm, code_buffer, [usage])
+                elif use_routing and is_large_input:
+                    # Route each chunk on its own complexity
+                    review_result, error = review_in_chunks(
+                        lambda chunk: review_code_routed(
+                            api_key, chunk, analyze_complexity(chunk.code, chunk.language), routing_rules, [usage]
+                        )[:2],
+                        code_buffer
+                    )
+                elif use_routing:
+                    # Use cheapest suitable model, escalating if needed
+                    review_result, error, route = review_code_routed(
+                        api_key, code_buffer, complexity_data, routing_rules, [usage]
+                    )
+                elif is_large_input:
+                    review_result, error = review_in_chunks(lambda chunk: review_code(llm, chunk, [usage]), code_buffer)
                 else:
                     # Use simple review approach
-                    review_result, error = review_code(llm, code_input, selected_language)
+                    review_result, error = review_code(llm, code_buffer, [usage])
+                
+                if result_store and review_result and not error and not cached_review:
+                    try:
+                        store_review_result(result_store, cache_key, {
+                            'review': review_result,
+                            'language': selected_language,
+                            'mode': review_mode,
+                            'route': route,
+                            'complexity_score': complexity_data['complexity_score'] if complexity_data else None
+                        })
+                    except sqlite3.Error as e:
+                        st.warning(f"Could not store review result: {str(e)}")
+                if result_store:
+                    result_store.close()
+                
+                record_review_metrics({
+                    'mode': review_mode,
+                    'language': selected_language,
+                    'model': usage.model,
+                    'input_chars': len(code_buffer),
+                    'complexity_score': complexity_data['complexity_score'] if complexity_data else None,
+                    'llm_calls': usage.llm_calls,
+                    'tokens': usage.tokens,
+                    'cost': usage.cost,
+                    'latency': time.perf_counter() - review_start,
+                    'cache_hit': cached_review is not None,
+                    'success': bool(review_result) and not error
+                })
+                
+                if not include_complexity:
+                    complexity_data = None
                 
                 if error:
                     st.error(f"❌ Error during review: {error}")
@@ -790,14 +2317,19 @@ def main():
                     st.session_state.review_history.append({
                         'language': selected_language,
                         'code': code_input[:100] + "..." if len(code_input) > 100 else code_input,
-                        'review': review_result,
+                        'review': compact_review(review_result, get_finding_store()),
                         'complexity': complexity_data,
                         'agent_used': use_agent,
+                        'route': route,
                         'timestamp': datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
                     })
                     
                     # Display results
                     success_msg = f"✅ Analysis completed! ({mode_text})"
+                    if cached_review:
+                        success_msg = f"✅ Stored review reused! ({mode_text})"
+                    if route:
+                        success_msg += f" on {MODEL_ROUTES[route]['model']}"
                     if include_complexity:
                         success_msg += " with complexity metrics"
                     st.success(success_msg)
@@ -820,7 +2352,7 @@ def main():
                     
                     if st.button(f"👁️ View Full Review", key=f"view_{i}"):
                         parse_and_display_results(
-                            history_item['review'], 
+                            expand_review(history_item['review'], get_finding_store()), 
                             history_item.get('complexity')
                         )
         else:
@@ -832,6 +2364,7 @@ def main():
             with col_hist1:
                 if st.button("🗑️ Clear History", use_container_width=True):
                     st.session_state.review_history = []
+                    st.session_state.finding_store = None
                     st.rerun()
             with col_hist2:
                 st.metric("📊 Total Reviews", len(st.session_state.review_history))
@@ -0,0 +1,280 @@
+"""Local benchmarks for CodeCritic AI (no API key needed)
+
+Usage:
+    python benchmark.py memory [--size-mb 4]
+    python benchmark.py complexity [--size-mb 1]
+    python benchmark.py storage [--reviews 500]
+    python benchmark.py workers [--jobs 200] [--size-kb 20] [--max-workers N] [--latency 0.0]
+"""
+import argparse
+import os
+import pickle
+import random
+import tempfile
+import time
+import tracemalloc
+
+from app import (
+    CHUNK_CHARS, REVIEW_SECTIONS, SIMPLE_REVIEW_PROMPT, CodeBuffer, FindingStore,
+    analyze_complexity, compact_review, expand_review, format_review_sections, iter_chunks
+)
+from workers import WorkerPool
+
+SAMPLE_FUNCTION = '''def process_item_{n}(items, threshold):
+    result = []
+    for item in items:
+        if item > threshold:
+            result.append(item * 2)
+        elif item == threshold:
+            result.append(item)
+        else:
+            while item < threshold:
+                item += 1
+    return result
+
+'''
+
+C_STYLE_SAMPLE_FUNCTION = '''    // Doubles items above the threshold
+    public int[] processItem{n}(int[] items, int threshold) {{
+        int[] result = new int[items.length];
+        for (int i = 0; i < items.length; i++) {{
+            if (items[i] > threshold) {{
+                result[i] = items[i] * 2;
+            }} else if (items[i] == threshold) {{
+                result[i] = items[i];
+            }} else {{
+                while (items[i] < threshold) {{
+                    items[i] += 1;
+                }}
+            }}
+        }}
+        return result;
+    }}
+
+'''
+
+def generate_code(size_bytes, template=SAMPLE_FUNCTION):
+    """Generate a file of roughly size_bytes from a function template, like a pasted generated module"""
+    parts = []
+    total = 0
+    n = 0
+    while total < size_bytes:
+        part = template.format(n=n)
+        parts.append(part)
+        total += len(part)
+        n += 1
+    return ''.join(parts)
+
+def measure(label, func, input_size):
+    """Time func, then rerun it under tracemalloc and print its peak allocation relative to the input"""
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<28} peak {peak / 1024 / 1024:8.2f} MB  ({peak / input_size:5.2f}x input)  {elapsed:6.3f}s")
+
+def legacy_line_list(code):
+    """The previous analyze_complexity first step, kept for comparison"""
+    lines = [line.strip() for line in code.split('\n') if line.strip()]
+    return sum(len(line.lower().split()) for line in lines)
+
+def legacy_keyword_scan(code, language):
+    """The previous analyze_complexity counting loop, kept for comparison"""
+    if language == 'python':
+        loop_keywords = ['for', 'while']
+        condition_keywords = ['if', 'elif', 'else']
+        function_keywords = ['def']
+        class_keywords = ['class']
+    elif language in ['javascript', 'typescript']:
+        loop_keywords = ['for', 'while', 'do']
+        condition_keywords = ['if', 'else']
+        function_keywords = ['function', 'const', 'let', 'var']
+        class_keywords = ['class']
+    elif language == 'java':
+        loop_keywords = ['for', 'while', 'do']
+        condition_keywords = ['if', 'else']
+        function_keywords = ['public', 'private', 'protected']
+        class_keywords = ['class', 'interface']
+    else:
+        loop_keywords = ['for', 'while', 'do']
+        condition_keywords = ['if', 'else']
+        function_keywords = ['function', 'def', 'public', 'private']
+        class_keywords = ['class']
+    counts = [0, 0, 0, 0]
+    max_nesting = 0
+    for line in code.split('\n'):
+        line = line.strip()
+        if not line:
+            continue
+        max_nesting = max(max_nesting, (len(line) - len(line.lstrip())) // 4)
+        for word in line.lower().split():
+            if word in loop_keywords:
+                counts[0] += 1
+            elif word in condition_keywords:
+                counts[1] += 1
+            elif word in function_keywords:
+                counts[2] += 1
+            elif word in class_keywords:
+                counts[3] += 1
+    return counts, max_nesting
+
+def bench_memory(size_mb):
+    code = generate_code(int(size_mb * 1024 * 1024))
+    print(f"Input: {len(code):,} characters")
+
+    measure("legacy line list", lambda: legacy_line_list(code), len(code))
+    measure("analyze_complexity", lambda: analyze_complexity(code, "python"), len(code))
+    measure("chunk iteration", lambda: sum(1 for _ in iter_chunks(code, CHUNK_CHARS)), len(code))
+
+    def build_chunk_prompts():
+        for _, _, chunk in iter_chunks(code, CHUNK_CHARS):
+            CodeBuffer(chunk, "python").prompt(SIMPLE_REVIEW_PROMPT)
+    measure("chunk prompts", build_chunk_prompts, len(code))
+
+def bench_complexity(size_mb):
+    size_bytes = int(size_mb * 1024 * 1024)
+    samples = {
+        "python": generate_code(size_bytes),
+        "javascript": generate_code(size_bytes, C_STYLE_SAMPLE_FUNCTION),
+        "java": generate_code(size_bytes, C_STYLE_SAMPLE_FUNCTION),
+        "cpp": generate_code(size_bytes, C_STYLE_SAMPLE_FUNCTION)
+    }
+
+    def timed(label, func, code, repeat=5):
+        best = min(timeit(func) for _ in range(repeat))
+        print(f"{label:<32} {best:6.3f}s  ({len(code) / best / 1024 / 1024:6.1f} MB/s)")
+
+    def timeit(func):
+        start = time.perf_counter()
+        func()
+        return time.perf_counter() - start
+
+    for language, code in samples.items():
+        print(f"{language}: {len(code):,} characters")
+        timed("  legacy keyword scan", lambda: legacy_keyword_scan(code, language), code)
+        timed("  analyze_complexity", lambda: analyze_complexity(code, language), code)
+
+COMMON_FINDINGS = [
+    "Missing input validation on function arguments | Validate types and ranges before use",
+    "Broad exception handler hides errors | Catch specific exceptions and log them",
+    "Function is too long and does several things | Split it into smaller helpers",
+    "Magic numbers make intent unclear | Move them into named constants",
+    "No docstrings on public functions | Add short docstrings describing inputs and outputs",
+    "Variable names are too short to be descriptive | Use names that describe their purpose",
+    "Nested loops give quadratic running time | Use a set or dict lookup instead",
+    "Resources are not closed on error | Use a context manager",
+    "Duplicated logic in several branches | Extract the shared code into a function",
+    "Mutable default argument | Use None and create the value inside the function",
+    "String concatenation in a loop | Collect parts in a list and join once",
+    "Global state makes the code hard to test | Pass dependencies in explicitly",
+    "Consistent naming and formatting",
+    "Clear separation between parsing and processing",
+    "Good use of early returns",
+    "Add type hints to function signatures",
+    "Add unit tests for edge cases",
+    "Document the expected input format in the module docstring",
+]
+
+def generate_reviews(count, seed=0):
+    """Generate review texts that reuse a pool of common findings, like a history of similar files"""
+    rng = random.Random(seed)
+    reviews = []
+    for n in range(count):
+        review = {
+            'score': f"{rng.randint(4, 9)}/10",
+            'summary': f"Review {n}: the code works but has maintainability issues worth addressing.",
+            'sections': {}
+        }
+        for name in REVIEW_SECTIONS:
+            items = rng.sample(COMMON_FINDINGS, rng.randint(1, 4))
+            if rng.random() < 0.2:
+                items.append(f"Function process_item_{n} shadows a builtin | Rename the local variable")
+            review['sections'][name] = items
+        reviews.append(format_review_sections(review))
+    return reviews
+
+def bench_storage(review_count):
+    reviews = generate_reviews(review_count)
+    raw_size = len(pickle.dumps(reviews))
+    print(f"{review_count} reviews, {sum(map(len, reviews)):,} characters")
+
+    start = time.perf_counter()
+    store = FindingStore()
+    compact = [compact_review(review, store) for review in reviews]
+    compact_time = time.perf_counter() - start
+    compact_size = len(pickle.dumps((store, compact)))
+
+    start = time.perf_counter()
+    restored = [expand_review(item, store) for item in compact]
+    expand_time = time.perf_counter() - start
+    assert restored == reviews, "compact round trip changed a review"
+
+    print(f"{'full text history':<28} {raw_size / 1024:8.1f} KB")
+    print(f"{'compact history':<28} {compact_size / 1024:8.1f} KB  ({raw_size / compact_size:4.1f}x smaller)")
+    print(f"{'unique strings':<28} {len(store):8d}")
+    print(f"{'compact all':<28} {compact_time * 1000:8.1f} ms")
+    print(f"{'expand all':<28} {expand_time * 1000:8.1f} ms  ({expand_time / review_count * 1e6:.0f} us per review)")
+
+def run_pool(jobs, workers, store_path, latency):
+    """Push every job through a pool and return (seconds, cache hits)"""
+    with WorkerPool(workers, store_path, offline_latency=latency) as pool:
+        start = time.perf_counter()
+        for job_id, code in enumerate(jobs):
+            pool.submit(job_id, "python", code)
+        hits = sum(result['cache_hit'] for result in pool.collect())
+        return time.perf_counter() - start, hits
+
+def bench_workers(job_count, size_kb, max_workers, latency):
+    # Distinct inputs so every job misses the store on the first pass
+    base = generate_code(int(size_kb * 1024))
+    jobs = [f"# job {n}\n{base}" for n in range(job_count)]
+    print(f"{job_count} jobs of {len(jobs[0]):,} characters, offline LLM stand-in "
+          f"({latency}s simulated latency), {os.cpu_count()} CPUs")
+
+    counts = sorted({1, max_workers} | {n for n in (2, 4, 8, 16) if n < max_workers})
+    baseline = None
+    for workers in counts:
+        with tempfile.TemporaryDirectory() as tmp:
+            store_path = os.path.join(tmp, "results.db")
+            elapsed, _ = run_pool(jobs, workers, store_path, latency)
+            warm_elapsed, hits = run_pool(jobs, workers, store_path, latency)
+        baseline = baseline or job_count / elapsed
+        throughput = job_count / elapsed
+        print(f"{workers:>3} workers  {throughput:8.1f} jobs/s  ({throughput / baseline:4.2f}x)  "
+              f"stored: {job_count / warm_elapsed:8.1f} jobs/s, {hits} hits")
+
+def main():
+    parser = argparse.ArgumentParser(description="CodeCritic AI local benchmarks")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    memory_parser = subparsers.add_parser("memory", help="Peak memory for large pasted inputs")
+    memory_parser.add_argument("--size-mb", type=float, default=4)
+
+    complexity_parser = subparsers.add_parser("complexity", help="CPU cost of complexity analysis")
+    complexity_parser.add_argument("--size-mb", type=float, default=1)
+
+    storage_parser = subparsers.add_parser("storage", help="History footprint with interned findings")
+    storage_parser.add_argument("--reviews", type=int, default=500)
+
+    workers_parser = subparsers.add_parser("workers", help="Worker pool throughput with the offline LLM")
+    workers_parser.add_argument("--jobs", type=int, default=200)
+    workers_parser.add_argument("--size-kb", type=float, default=20)
+    workers_parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    workers_parser.add_argument("--latency", type=float, default=0.0, help="Simulated LLM latency per review")
+
+    args = parser.parse_args()
+    if args.command == "memory":
+        bench_memory(args.size_mb)
+    elif args.command == "complexity":
+        bench_complexity(args.size_mb)
+    elif args.command == "storage":
+        bench_storage(args.reviews)
+    elif args.command == "workers":
+        bench_workers(args.jobs, args.size_kb, args.max_workers, args.latency)
+
+if __name__ == "__main__":
+    main()
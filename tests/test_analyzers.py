@@ -0,0 +1,111 @@
+import time
+
+import pytest
+
+from app import analyze_complexity, analyze_functions
+
+
+def counts(code, language):
+    metrics = analyze_complexity(code, language)
+    return (
+        metrics['nested_loops'],
+        metrics['conditional_statements'],
+        metrics['function_definitions'],
+        metrics['class_definitions'],
+        metrics['max_nesting']
+    )
+
+
+def spans(code, language):
+    return [(function['name'], function['first_line'], function['last_line']) for function in analyze_functions(code, language)]
+
+
+JAVASCRIPT = '''const a = 1;
+let b = "for (x) { if }";
+var c = 3; // while if
+/* for if */
+const g = (x) => {
+  for (const y of x) {
+    if (y) { return y; }
+  }
+};
+'''
+
+PYTHON = '''class A:
+    def m(self):
+        # for if
+        s = "while if"
+        for x in y:
+            if x:
+                pass
+
+    def n(self):
+        return 1
+'''
+
+JAVA = '''class A {
+  void run() throws IOException, foo.Bar {
+    if (x) {}
+  }
+  int size() {
+    return 1;
+  }
+}
+'''
+
+RUBY = '''def f(x)
+  if x
+    1
+  end
+end
+
+def g
+  2
+end
+'''
+
+SQL = '''CREATE PROCEDURE p() BEGIN
+  IF x THEN
+    WHILE y DO SET a = (1); END WHILE;
+  End If;
+  if z then select 1; end if;
+END;
+'''
+
+
+def test_declarations_strings_and_comments_are_not_counted():
+    # const/let/var are not functions; keywords inside strings and comments are skipped
+    assert counts(JAVASCRIPT, 'javascript') == (1, 1, 1, 0, 3)
+
+
+def test_python_counts_and_indent_nesting():
+    assert counts(PYTHON, 'python') == (1, 1, 2, 1, 4)
+
+
+def test_sql_end_markers_are_case_insensitive():
+    assert counts(SQL, 'sql') == (1, 2, 1, 0, 1)
+
+
+@pytest.mark.parametrize("code, language, expected", [
+    (JAVASCRIPT, 'javascript', [('g', 5, 9)]),
+    (PYTHON, 'python', [('m', 2, 7), ('n', 9, 10)]),
+    (JAVA, 'java', [('run', 2, 4), ('size', 5, 7)]),
+    (RUBY, 'ruby', [('f', 1, 5), ('g', 7, 9)]),
+    ("function f(a: number): Map<string, number> {\n  return a\n}\nclass B { run(): void {\n} }\n", 'typescript', [('f', 1, 3), ('run', 4, 5)])
+])
+def test_function_spans(code, language, expected):
+    assert spans(code, language) == expected
+
+
+def test_function_nesting_is_relative_to_its_definition():
+    functions = analyze_functions(PYTHON, 'python')
+    assert [function['max_nesting'] for function in functions] == [3, 1]
+
+
+@pytest.mark.parametrize("language", ['javascript', 'typescript', 'java', 'cpp', 'csharp'])
+def test_long_ternary_chain_is_linear(language):
+    # Each ':' after a ')' used to double the backtracking in the function-definition lookahead
+    line = "const t = isA(v) ? a(v) : " + " : ".join(f"c{i} ? {i}" for i in range(40)) + " : 0;\n"
+    start = time.perf_counter()
+    analyze_complexity(line, language)
+    assert time.perf_counter() - start < 1.0
@@ -0,0 +1,21 @@
+from app import iter_chunks
+
+
+def line_ranges(code, max_chars):
+    return [(first, last) for first, last, _ in iter_chunks(code, max_chars)]
+
+
+def test_chunks_split_on_line_boundaries():
+    code = "a\nbb\nccc\ndddd\n"
+    assert line_ranges(code, 6) == [(1, 2), (3, 3), (4, 4)]
+    assert ''.join(chunk for _, _, chunk in iter_chunks(code, 6)) == code
+
+
+def test_overlong_line_keeps_its_line_number():
+    code = "x" * 150_000 + "\nlast"
+    assert line_ranges(code, 60_000) == [(1, 1), (1, 1), (1, 2)]
+
+
+def test_line_numbers_continue_after_an_overlong_line():
+    code = "y" * 25 + "\nshort\nend\n"
+    assert line_ranges(code, 10) == [(1, 1), (1, 1), (1, 1), (2, 3)]
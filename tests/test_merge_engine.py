@@ -0,0 +1,71 @@
+from app import merge_tool_outputs, parse_finding, parse_review_sections
+
+
+def merged_sections(outputs):
+    return parse_review_sections(merge_tool_outputs(outputs))['sections']
+
+
+def test_severity_prefix_sets_priority_and_is_stripped():
+    finding = parse_finding("HIGH: SQL built by string formatting (Line 12) | Fix: Use parameters", "CodeQualityAnalyzer", "MEDIUM_PRIORITY_ISSUES")
+    assert finding['section'] == "HIGH_PRIORITY_ISSUES"
+    assert finding['text'] == "SQL built by string formatting (Line 12)"
+    assert finding['lines'] == (12, 12)
+
+
+def test_bracketed_severity_tag():
+    finding = parse_finding("[LOW] Unused import", "CodeQualityAnalyzer", "MEDIUM_PRIORITY_ISSUES")
+    assert finding['section'] == "LOW_PRIORITY_ISSUES"
+    assert finding['text'] == "Unused import"
+
+
+def test_severity_words_in_plain_sentences_are_not_prefixes():
+    sections = merged_sections({
+        'CodeQualityAnalyzer': (
+            "STRENGTHS:\n"
+            "- High readability of the main loop\n"
+            "ISSUES:\n"
+            "- Critical section is not protected by a lock (Line 4)\n"
+            "- Low test coverage for the parser (Line 30)\n"
+            "SUGGESTIONS:\n"
+            "- Medium-term: split the module\n"
+        )
+    })
+    assert sections['STRENGTHS'] == ["High readability of the main loop"]
+    assert sections['MEDIUM_PRIORITY_ISSUES'] == [
+        "Critical section is not protected by a lock (Line 4)",
+        "Low test coverage for the parser (Line 30)"
+    ]
+    assert sections['HIGH_PRIORITY_ISSUES'] == []
+    assert sections['LOW_PRIORITY_ISSUES'] == []
+    assert sections['IMPROVEMENTS'] == ["Medium-term: split the module"]
+
+
+def test_prefix_not_stripped_outside_issue_sections():
+    sections = merged_sections({'CodeQualityAnalyzer': "SUGGESTIONS:\n- HIGH: value caching would help\n"})
+    assert sections['IMPROVEMENTS'] == ["HIGH: value caching would help"]
+
+
+def test_duplicates_across_tools_keep_highest_priority():
+    sections = merged_sections({
+        'CodeQualityAnalyzer': "ISSUES:\n- MEDIUM: SQL query built with string formatting (Line 12) | Fix: Use parameters\n",
+        'SecurityChecker': "ISSUES:\n- HIGH: SQL injection via string formatting in query (Lines 11-13) | Fix: Use parameters\n"
+    })
+    assert sections['HIGH_PRIORITY_ISSUES'] == ["SQL injection via string formatting in query (Lines 11-13) | Fix: Use parameters"]
+    assert sections['MEDIUM_PRIORITY_ISSUES'] == []
+
+
+def test_nothing_found_bullets_are_not_findings():
+    review = merge_tool_outputs({
+        'SecurityChecker': "ISSUES:\n- No security vulnerabilities found.\n",
+        'CodeQualityAnalyzer': "QUALITY_SCORE: 9/10\nSTRENGTHS:\n- None\nISSUES:\n- None\n- N/A\n- MEDIUM: No issues detected\n",
+        'ComplexityAnalyzer': "MAINTAINABILITY: 9/10\nCOMPLEXITY_FACTORS:\n- Deep nesting levels: none\n- Long methods/functions: N/A\n"
+    })
+    parsed = parse_review_sections(review)
+    for name in ('STRENGTHS', 'HIGH_PRIORITY_ISSUES', 'MEDIUM_PRIORITY_ISSUES', 'LOW_PRIORITY_ISSUES'):
+        assert parsed['sections'][name] == []
+    assert parsed['score'] == "9.3/10"
+
+
+def test_negative_wording_with_a_line_reference_is_kept():
+    sections = merged_sections({'SecurityChecker': "ISSUES:\n- No input validation found for user_id (Line 4)\n"})
+    assert sections['HIGH_PRIORITY_ISSUES'] == ["No input validation found for user_id (Line 4)"]
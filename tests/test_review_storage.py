@@ -0,0 +1,35 @@
+from app import FindingStore, compact_review, expand_review, format_review_sections, REVIEW_SECTIONS
+
+
+def round_trip(text, store):
+    return expand_review(compact_review(text, store), store)
+
+
+def test_canonical_review_is_interned_and_exact():
+    store = FindingStore()
+    review = format_review_sections({
+        'score': "7/10",
+        'summary': "Works, with a few issues.",
+        'sections': {name: [f"{name.lower()} finding"] for name in REVIEW_SECTIONS}
+    })
+    compact = compact_review(review, store)
+    assert 'raw' not in compact
+    assert expand_review(compact, store) == review
+
+
+def test_non_canonical_review_keeps_its_text():
+    store = FindingStore()
+    review = (
+        "The code is mostly fine, but the parser needs attention.\n\n"
+        "HIGH_PRIORITY_ISSUES:\n"
+        "- SQL built by string formatting (Line 12)\n"
+    )
+    compact = compact_review(review, store)
+    assert 'raw' in compact
+    assert expand_review(compact, store) == review
+
+
+def test_indented_llm_output_is_not_rewritten():
+    store = FindingStore()
+    review = "SCORE: 8/10\n    SUMMARY: Good.\nSTRENGTHS:\n  - Clear names\n"
+    assert round_trip(review, store) == review
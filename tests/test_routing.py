@@ -0,0 +1,61 @@
+import app
+from app import DEFAULT_ROUTING_RULES, MODEL_ROUTES, CodeBuffer, OfflineLLM, next_route, review_code_routed, select_route
+
+
+class ScorelessLLM(OfflineLLM):
+    """Offline model that drops the SCORE line, like a weak model ignoring the format"""
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        result = super()._generate(messages, stop, run_manager, **kwargs)
+        message = result.generations[0].message
+        message.content = '\n'.join(line for line in message.content.split('\n') if not line.startswith('SCORE:'))
+        return result
+
+
+def complexity(score, lines=10):
+    return {'complexity_score': score, 'total_lines': lines}
+
+
+def test_select_route_thresholds():
+    rules = DEFAULT_ROUTING_RULES
+    assert select_route(complexity(rules['fast_max_score'] - 0.5)) == 'fast'
+    assert select_route(complexity(rules['fast_max_score'])) == 'standard'
+    assert select_route(complexity(1, rules['fast_max_lines'] + 1)) == 'standard'
+    assert select_route(complexity(rules['strong_min_score'])) == 'strong'
+    assert select_route(complexity(5), {**rules, 'fast_max_score': 3}) == 'standard'
+
+
+def test_next_route():
+    assert [next_route(route) for route in MODEL_ROUTES] == ['standard', 'strong', None]
+
+
+def routed_review(monkeypatch, weak_routes, rules=None):
+    stats = []
+    monkeypatch.setattr(app, 'initialize_route_llm', lambda api_key, route: (
+        (ScorelessLLM if route in weak_routes else OfflineLLM)(model=MODEL_ROUTES[route]['model'])
+    ))
+    monkeypatch.setattr(app, 'record_route_stats', lambda route, latency, tokens, escalated=False: stats.append((route, escalated)))
+    code_buffer = CodeBuffer("def f(x):\n    return x\n", "python")
+    review, error, route = review_code_routed(None, code_buffer, complexity(1), rules)
+    return review, error, route, stats
+
+
+def test_missing_score_escalates_to_next_route(monkeypatch):
+    review, error, route, stats = routed_review(monkeypatch, {'fast'})
+    assert error is None
+    assert route == 'standard'
+    assert review.startswith("SCORE:")
+    assert stats == [('fast', False), ('standard', True)]
+
+
+def test_escalation_stops_at_strongest_route(monkeypatch):
+    review, error, route, stats = routed_review(monkeypatch, set(MODEL_ROUTES))
+    assert error is None and route == 'strong'
+    assert "SCORE:" not in review
+    assert [call[0] for call in stats] == ['fast', 'standard', 'strong']
+
+
+def test_escalation_can_be_disabled(monkeypatch):
+    _, _, route, stats = routed_review(monkeypatch, {'fast'}, {**DEFAULT_ROUTING_RULES, 'escalate_on_missing_score': False})
+    assert route == 'fast'
+    assert stats == [('fast', False)]
@@ -0,0 +1,18 @@
+import watcher
+from app import load_file_index
+
+
+def test_file_grown_past_input_limit_is_dropped_from_index(tmp_path, monkeypatch):
+    source = tmp_path / "module.py"
+    source.write_text("def f(x):\n    return x\n")
+    index_db = str(tmp_path / "index.db")
+    indexer = watcher.TreeIndexer(str(tmp_path), index_db)
+    assert indexer.index_path(str(source))
+    assert load_file_index(str(source), index_db)
+
+    monkeypatch.setattr(watcher, 'MAX_INPUT_CHARS', 10)
+    source.write_text("def f(x):\n    return x + 1\n")
+    assert indexer.index_path(str(source))
+    assert str(source) not in indexer.known
+    assert not load_file_index(str(source), index_db)
+    indexer.close()
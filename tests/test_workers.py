@@ -0,0 +1,54 @@
+from app import connect_result_store, load_cached_review, review_cache_key, store_review_result
+from workers import WorkerPool
+
+CODE = "def f(x):\n    for i in x:\n        if i:\n            print(i)\n"
+
+
+def test_review_cache_key_covers_every_input():
+    key = review_cache_key(CODE, "python", "simple", "offline")
+    assert key == review_cache_key(CODE, "python", "simple", "offline")
+    assert len({
+        key,
+        review_cache_key(CODE + "\n", "python", "simple", "offline"),
+        review_cache_key(CODE, "ruby", "simple", "offline"),
+        review_cache_key(CODE, "python", "agent", "offline"),
+        review_cache_key(CODE, "python", "simple", "gemini-1.5-flash")
+    }) == 5
+
+
+def test_first_stored_review_wins(tmp_path):
+    conn = connect_result_store(str(tmp_path / "results.db"))
+    record = {'language': "python", 'mode': "simple", 'complexity_score': 1.0}
+    store_review_result(conn, "key", {**record, 'review': "SCORE: 7/10"})
+    store_review_result(conn, "key", {**record, 'review': "SCORE: 2/10"})
+    assert load_cached_review(conn, "key") == ("SCORE: 7/10", None)
+    assert load_cached_review(conn, "other") is None
+    conn.close()
+
+
+def test_offline_pool_round_trip(tmp_path):
+    store_path = str(tmp_path / "results.db")
+    with WorkerPool(2, store_path) as pool:
+        pool.submit("a", "python", CODE)
+        pool.submit("b", "javascript", "function g() { return 1; }\n")
+        first = {result['job_id']: result for result in pool.collect()}
+        pool.submit("a again", "python", CODE)
+        second = list(pool.collect())
+
+    assert sorted(first) == ["a", "b"]
+    assert all(result['error'] is None and not result['cache_hit'] for result in first.values())
+    assert first['a']['score'] is not None
+    assert [(result['job_id'], result['cache_hit'], result['score']) for result in second] == [
+        ("a again", True, first['a']['score'])
+    ]
+
+
+def test_collect_reports_jobs_of_a_dead_worker(tmp_path):
+    with WorkerPool(1, str(tmp_path / "results.db")) as pool:
+        pool.processes[0].terminate()
+        pool.processes[0].join()
+        pool.submit("lost", "python", CODE)
+        results = list(pool.collect())
+
+    assert [result['job_id'] for result in results] == ["lost"]
+    assert "exited" in results[0]['error']
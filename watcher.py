@@ -0,0 +1,376 @@
+"""Watch a working tree and keep an incremental complexity index (no Streamlit session needed)
+
+Usage:
+    python watcher.py watch [ROOT] [--poll] [--interval 1.0] [--review] [--review-threshold 25]
+    python watcher.py hotspots [--limit 10]
+    python watcher.py file PATH
+"""
+import argparse
+import ctypes
+import ctypes.util
+import hashlib
+import os
+import queue
+import select
+import struct
+import sys
+import threading
+import time
+
+from app import (
+    INDEX_DB_PATH, MAX_INPUT_CHARS, CodeBuffer, analyze_complexity, analyze_functions,
+    connect_index_store, decompress_text, has_function_review, initialize_llm, load_file_index,
+    load_hotspots, remove_file_index, review_code, store_file_index, store_function_review
+)
+
+EXTENSION_LANGUAGES = {
+    '.py': 'python', '.js': 'javascript', '.jsx': 'javascript', '.mjs': 'javascript',
+    '.ts': 'typescript', '.tsx': 'typescript', '.java': 'java',
+    '.cpp': 'cpp', '.cc': 'cpp', '.cxx': 'cpp', '.hpp': 'cpp', '.h': 'cpp', '.c': 'cpp',
+    '.cs': 'csharp', '.go': 'go', '.rs': 'rust', '.php': 'php', '.rb': 'ruby',
+    '.html': 'html', '.htm': 'html', '.css': 'css', '.sql': 'sql'
+}
+IGNORED_DIRS = {'.git', '.hg', '.svn', 'node_modules', '__pycache__', '.venv', 'venv', 'build', 'dist', 'target'}
+# Changes arriving within this window are handled as one batch (editors write in several steps)
+DEBOUNCE_SECONDS = 0.2
+
+def language_for(path):
+    """Language of a source file from its extension, or None for files we don't index"""
+    return EXTENSION_LANGUAGES.get(os.path.splitext(path)[1].lower())
+
+def is_ignored_dir(name):
+    return name in IGNORED_DIRS or name.startswith('.')
+
+def iter_source_files(root):
+    """Yield absolute paths of indexable files under root, skipping VCS, dependency and build dirs"""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [name for name in dirnames if not is_ignored_dir(name)]
+        for filename in filenames:
+            if language_for(filename):
+                yield os.path.join(dirpath, filename)
+
+def content_hash(data):
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+class TreeIndexer:
+    """Keeps the index in sync with a tree, re-analyzing only files whose content changed"""
+
+    def __init__(self, root, index_path=INDEX_DB_PATH, review_queue=None, review_threshold=25):
+        self.root = os.path.realpath(root)
+        self.conn = connect_index_store(index_path)
+        self.review_queue = review_queue
+        self.review_threshold = review_threshold
+        # path -> (size, mtime, content_hash), loaded once so unchanged files cost one stat
+        self.known = {
+            row['path']: (row['size'], row['mtime'], row['content_hash'])
+            for row in self.conn.execute("SELECT path, size, mtime, content_hash FROM indexed_files")
+            if row['path'].startswith(self.root + os.sep)
+        }
+
+    def full_scan(self):
+        """Index new and modified files and drop deleted ones; returns the paths that changed"""
+        seen = set()
+        changed = []
+        for path in iter_source_files(self.root):
+            seen.add(path)
+            if self.index_path(path):
+                changed.append(path)
+        for path in set(self.known) - seen:
+            self.index_path(path)
+            changed.append(path)
+        return changed
+
+    def index_path(self, path):
+        """Bring one path's index rows up to date; returns True if its content changed"""
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            if self.known.pop(path, None):
+                remove_file_index(self.conn, path)
+                return True
+            return False
+
+        known = self.known.get(path)
+        if known and known[:2] == (stat.st_size, stat.st_mtime):
+            return False
+        if stat.st_size > MAX_INPUT_CHARS:
+            # Too large to analyze: drop whatever was indexed while it was still small enough
+            if self.known.pop(path, None):
+                remove_file_index(self.conn, path)
+                return True
+            return False
+
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return False
+        digest = content_hash(data)
+        if known and known[2] == digest:
+            # Touched but not modified: remember the new mtime, skip the analysis
+            with self.conn:
+                self.conn.execute("UPDATE indexed_files SET mtime = ? WHERE path = ?", (stat.st_mtime, path))
+            self.known[path] = (stat.st_size, stat.st_mtime, digest)
+            return False
+
+        language = language_for(path)
+        code = data.decode('utf-8', errors='replace')
+        functions = analyze_functions(code, language)
+        for function in functions:
+            function['path'] = path
+            function['content_hash'] = content_hash(function['code'].encode('utf-8'))
+
+        file_record = {
+            'path': path,
+            'language': language,
+            'content_hash': digest,
+            'size': stat.st_size,
+            'mtime': stat.st_mtime,
+            'indexed_at': time.time(),
+            **analyze_complexity(code, language)
+        }
+        new_functions = store_file_index(self.conn, file_record, functions)
+        self.known[path] = (stat.st_size, stat.st_mtime, digest)
+
+        if self.review_queue:
+            for function in new_functions:
+                if function['complexity_score'] >= self.review_threshold:
+                    self.review_queue.submit(function, language)
+        return True
+
+    def close(self):
+        self.conn.close()
+
+class InotifyWatcher:
+    """Linux inotify watches on every directory of the tree, via libc"""
+    IN_MODIFY = 0x00000002
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ISDIR = 0x40000000
+    WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+    EVENT_HEADER = struct.Struct('iIII')
+
+    def __init__(self, root):
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.watches = {}
+        self.add_tree(root)
+
+    def add_tree(self, root):
+        """Watch root and its subdirectories; returns the source files already inside them"""
+        files = []
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames[:] = [name for name in dirnames if not is_ignored_dir(name)]
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(dirpath), self.WATCH_MASK)
+            if wd < 0:
+                error = ctypes.get_errno()
+                if dirpath == root:
+                    raise OSError(error, f"Cannot watch {dirpath}")
+                continue
+            self.watches[wd] = dirpath
+            files.extend(os.path.join(dirpath, name) for name in filenames if language_for(name))
+        return files
+
+    def changes(self, timeout):
+        """Paths changed since the last call, an empty set on timeout, or None if a rescan is needed"""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return set()
+
+        changed = set()
+        while ready:
+            if not self._read_events(changed):
+                return None
+            ready, _, _ = select.select([self.fd], [], [], DEBOUNCE_SECONDS)
+        return changed
+
+    def _read_events(self, changed):
+        data = os.read(self.fd, 64 * 1024)
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, name_length = self.EVENT_HEADER.unpack_from(data, offset)
+            offset += self.EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + name_length].rstrip(b'\0'))
+            offset += name_length
+
+            if mask & self.IN_Q_OVERFLOW:
+                return False
+            if mask & self.IN_IGNORED:
+                self.watches.pop(wd, None)
+                continue
+            directory = self.watches.get(wd)
+            if directory is None:
+                continue
+            path = os.path.join(directory, name)
+            if mask & self.IN_ISDIR:
+                if mask & (self.IN_CREATE | self.IN_MOVED_TO) and not is_ignored_dir(name):
+                    changed.update(self.add_tree(path))
+                elif mask & (self.IN_DELETE | self.IN_MOVED_FROM):
+                    # Files under a removed directory don't get their own events
+                    return False
+            elif name and language_for(name):
+                changed.add(path)
+        return True
+
+    def close(self):
+        os.close(self.fd)
+
+class PollingWatcher:
+    """Portable fallback: stat the tree every interval and report files whose size or mtime moved"""
+
+    def __init__(self, root):
+        self.root = root
+        self.snapshot = self.scan()
+
+    def scan(self):
+        snapshot = {}
+        for path in iter_source_files(self.root):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            snapshot[path] = (stat.st_size, stat.st_mtime)
+        return snapshot
+
+    def changes(self, timeout):
+        time.sleep(timeout)
+        snapshot = self.scan()
+        changed = {path for path, stat in snapshot.items() if self.snapshot.get(path) != stat}
+        changed.update(set(self.snapshot) - set(snapshot))
+        self.snapshot = snapshot
+        return changed
+
+    def close(self):
+        pass
+
+def create_watcher(root, poll=False):
+    """inotify on Linux, polling elsewhere or when inotify is unavailable"""
+    if not poll and sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(root)
+        except (OSError, AttributeError) as e:
+            print(f"inotify unavailable ({e}), falling back to polling")
+    return PollingWatcher(root)
+
+class ReviewQueue:
+    """Background thread running review_code on changed high-complexity functions"""
+
+    def __init__(self, api_key, index_path=INDEX_DB_PATH):
+        self.api_key = api_key
+        self.index_path = index_path
+        self.jobs = queue.Queue()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def submit(self, function, language):
+        self.jobs.put((function, language))
+
+    def run(self):
+        # SQLite connections can't be shared across threads, so the worker opens its own
+        conn = connect_index_store(self.index_path)
+        llm = initialize_llm(self.api_key)
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                break
+            function, language = job
+            if not llm or has_function_review(conn, function['content_hash']):
+                continue
+            review, error = review_code(llm, CodeBuffer(function['code'], language))
+            if error:
+                print(f"Review failed for {function['name']} in {function['path']}: {error}")
+                continue
+            store_function_review(conn, function, review)
+            print(f"Reviewed {function['name']} in {function['path']}")
+        conn.close()
+
+    def close(self):
+        self.jobs.put(None)
+        self.thread.join()
+
+def watch(root, poll=False, interval=1.0, review=False, review_threshold=25):
+    review_queue = None
+    if review:
+        api_key = os.environ.get('GOOGLE_API_KEY')
+        if not api_key:
+            sys.exit("Set GOOGLE_API_KEY to enable background reviews")
+        review_queue = ReviewQueue(api_key)
+
+    indexer = TreeIndexer(root, review_queue=review_queue, review_threshold=review_threshold)
+    watcher = create_watcher(indexer.root, poll)
+    start = time.perf_counter()
+    changed = indexer.full_scan()
+    print(f"Indexed {len(indexer.known)} files under {indexer.root} "
+          f"({len(changed)} updated) in {time.perf_counter() - start:.2f}s; "
+          f"watching with {type(watcher).__name__}")
+
+    try:
+        while True:
+            changes = watcher.changes(interval)
+            if changes is None:
+                changed = indexer.full_scan()
+            else:
+                changed = [path for path in sorted(changes) if indexer.index_path(path)]
+            for path in changed:
+                print(f"Updated {os.path.relpath(path, indexer.root)}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
+        indexer.close()
+        if review_queue:
+            review_queue.close()
+
+def print_hotspots(limit):
+    for row in load_hotspots(limit=limit):
+        reviewed = " (reviewed)" if row['reviewed'] else ""
+        print(f"{row['complexity_score']:6.1f}  {row['complexity_level']:<6}  "
+              f"{row['path']}:{row['first_line']}-{row['last_line']}  {row['name']}{reviewed}")
+
+def print_file(file_path):
+    file_index = load_file_index(os.path.realpath(file_path))
+    if file_index is None:
+        sys.exit(f"{file_path} is not indexed")
+    print(f"{file_index['path']} ({file_index['language']}): score {file_index['complexity_score']} "
+          f"({file_index['complexity_level']}), {file_index['total_lines']:.0f} lines, "
+          f"max nesting {file_index['max_nesting']:.0f}")
+    for function in file_index['functions']:
+        print(f"  {function['complexity_score']:6.1f}  lines {function['first_line']}-{function['last_line']}  {function['name']}")
+        if function['review']:
+            print('    ' + decompress_text(function['codec'], function['review']).replace('\n', '\n    '))
+
+def main():
+    parser = argparse.ArgumentParser(description="CodeCritic AI working tree index")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    watch_parser = subparsers.add_parser("watch", help="Index a tree and keep the index current")
+    watch_parser.add_argument("root", nargs="?", default=".")
+    watch_parser.add_argument("--poll", action="store_true", help="Use polling instead of inotify")
+    watch_parser.add_argument("--interval", type=float, default=1.0, help="Seconds between polls")
+    watch_parser.add_argument("--review", action="store_true", help="Review changed complex functions in the background")
+    watch_parser.add_argument("--review-threshold", type=float, default=25, help="Minimum complexity score to review")
+
+    hotspots_parser = subparsers.add_parser("hotspots", help="Most complex functions in the index")
+    hotspots_parser.add_argument("--limit", type=int, default=10)
+
+    file_parser = subparsers.add_parser("file", help="Indexed metrics for one file")
+    file_parser.add_argument("path")
+
+    args = parser.parse_args()
+    if args.command == "watch":
+        watch(args.root, args.poll, args.interval, args.review, args.review_threshold)
+    elif args.command == "hotspots":
+        print_hotspots(args.limit)
+    elif args.command == "file":
+        print_file(args.path)
+
+if __name__ == "__main__":
+    main()
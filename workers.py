@@ -0,0 +1,180 @@
+"""Review many inputs in parallel worker processes that share one on-disk result store
+
+Usage:
+    python workers.py review PATHS... [--workers N] [--offline] [--latency 0.0]
+"""
+import argparse
+import multiprocessing
+import os
+import queue
+import sys
+import time
+
+from app import (
+    CHUNK_CHARS, MODEL_ROUTES, OFFLINE_RESULTS_DB_PATH, RESULTS_DB_PATH, CodeBuffer, OfflineLLM,
+    analyze_complexity, connect_result_store, initialize_llm, load_cached_review, model_name,
+    parse_review_sections, review_cache_key, review_code, review_in_chunks, store_review_result
+)
+from watcher import language_for
+
+# Workers share results by content hash, so the pool only runs the simple review mode
+WORKER_REVIEW_MODE = "simple"
+# How often collect() checks that workers with outstanding jobs are still alive
+RESULT_POLL_SECONDS = 1.0
+
+def shard_for(cache_key, workers):
+    """Worker index for a job; identical inputs always land on the same worker"""
+    return int(cache_key[:8], 16) % workers
+
+def run_worker(shard, jobs, results, store_path, api_key, offline_latency):
+    """Worker process loop: serve jobs from the store when possible, otherwise review and store them"""
+    conn = connect_result_store(store_path)
+    llm = initialize_llm(api_key, MODEL_ROUTES['standard']['model']) if api_key else OfflineLLM(latency=offline_latency)
+    while True:
+        job = jobs.get()
+        if job is None:
+            break
+        job_id, cache_key, language, code = job
+        start = time.perf_counter()
+
+        # Every job reports back, even on a failure, so the parent never waits on a lost result
+        cached = None
+        try:
+            cached = load_cached_review(conn, cache_key)
+            if cached:
+                review, error = cached[0], None
+            else:
+                code_buffer = CodeBuffer(code, language)
+                complexity = analyze_complexity(code, language)
+                if len(code_buffer) > CHUNK_CHARS:
+                    review, error = review_in_chunks(lambda chunk: review_code(llm, chunk), code_buffer)
+                else:
+                    review, error = review_code(llm, code_buffer)
+                if review and not error:
+                    store_review_result(conn, cache_key, {
+                        'review': review,
+                        'language': language,
+                        'mode': WORKER_REVIEW_MODE,
+                        'complexity_score': complexity['complexity_score']
+                    })
+        except Exception as e:
+            review, error = None, f"{type(e).__name__}: {e}"
+
+        results.put({
+            'job_id': job_id,
+            'shard': shard,
+            'cache_hit': cached is not None,
+            'score': parse_review_sections(review)['score'] if review else None,
+            'error': error,
+            'latency': time.perf_counter() - start
+        })
+    conn.close()
+
+class WorkerPool:
+    """N review processes, each owning the jobs whose content hash maps to it"""
+
+    def __init__(self, workers=None, store_path=None, api_key=None, offline_latency=0.0):
+        self.workers = workers or os.cpu_count() or 1
+        # Results are keyed by model, and offline runs get their own store unless one is given
+        self.model = MODEL_ROUTES['standard']['model'] if api_key else model_name(OfflineLLM())
+        store_path = store_path or (RESULTS_DB_PATH if api_key else OFFLINE_RESULTS_DB_PATH)
+        # Create the schema and switch to WAL once, before workers open their own connections
+        connect_result_store(store_path).close()
+        self.results = multiprocessing.Queue()
+        self.queues = [multiprocessing.Queue() for _ in range(self.workers)]
+        self.processes = [
+            multiprocessing.Process(
+                target=run_worker,
+                args=(shard, self.queues[shard], self.results, store_path, api_key, offline_latency),
+                daemon=True
+            )
+            for shard in range(self.workers)
+        ]
+        for process in self.processes:
+            process.start()
+        # shard -> job ids sent to that worker and not yet reported
+        self.pending = [[] for _ in range(self.workers)]
+
+    def submit(self, job_id, language, code):
+        cache_key = review_cache_key(code, language, WORKER_REVIEW_MODE, self.model)
+        shard = shard_for(cache_key, self.workers)
+        self.queues[shard].put((job_id, cache_key, language, code))
+        self.pending[shard].append(job_id)
+
+    def collect(self):
+        """Yield results as they finish, until every submitted job has reported or its worker died"""
+        while any(self.pending):
+            try:
+                result = self.results.get(timeout=RESULT_POLL_SECONDS)
+            except queue.Empty:
+                yield from self.fail_dead_workers()
+                continue
+            pending = self.pending[result['shard']]
+            if result['job_id'] in pending:
+                pending.remove(result['job_id'])
+                yield result
+
+    def fail_dead_workers(self):
+        """Report the outstanding jobs of workers that exited without finishing them"""
+        for shard, process in enumerate(self.processes):
+            if not self.pending[shard] or process.is_alive():
+                continue
+            for job_id in self.pending[shard]:
+                yield {
+                    'job_id': job_id,
+                    'shard': shard,
+                    'cache_hit': False,
+                    'score': None,
+                    'error': f"Worker {shard} exited with code {process.exitcode}",
+                    'latency': 0.0
+                }
+            self.pending[shard] = []
+
+    def close(self):
+        for jobs in self.queues:
+            jobs.put(None)
+        for process in self.processes:
+            process.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def review_paths(paths, workers, offline, latency):
+    api_key = None
+    if not offline:
+        api_key = os.environ.get('GOOGLE_API_KEY')
+        if not api_key:
+            sys.exit("Set GOOGLE_API_KEY or pass --offline")
+
+    files = [path for path in paths if language_for(path)]
+    start = time.perf_counter()
+    with WorkerPool(workers, api_key=api_key, offline_latency=latency) as pool:
+        for path in files:
+            with open(path, encoding='utf-8', errors='replace') as f:
+                pool.submit(path, language_for(path), f.read())
+        for result in pool.collect():
+            status = result['error'] or result['score']
+            cached = " (stored)" if result['cache_hit'] else ""
+            print(f"[worker {result['shard']}] {result['job_id']}: {status}{cached}")
+    elapsed = time.perf_counter() - start
+    print(f"Reviewed {len(files)} files with {pool.workers} workers in {elapsed:.2f}s")
+
+def main():
+    parser = argparse.ArgumentParser(description="CodeCritic AI worker pool")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    review_parser = subparsers.add_parser("review", help="Review source files in parallel")
+    review_parser.add_argument("paths", nargs="+")
+    review_parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    review_parser.add_argument("--offline", action="store_true", help="Use the offline LLM stand-in")
+    review_parser.add_argument("--latency", type=float, default=0.0, help="Simulated offline LLM latency in seconds")
+
+    args = parser.parse_args()
+    if args.command == "review":
+        review_paths(args.paths, args.workers, args.offline, args.latency)
+
+if __name__ == "__main__":
+    main()